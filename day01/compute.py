@@ -1,9 +1,25 @@
+import bisect
 import dataclasses
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import resource
+import time
 from argparse import ArgumentParser
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
 from operator import attrgetter
 from typing import (
+    Callable,
+    Dict,
+    Iterable,
     List,
+    Optional,
     Self,
+    Tuple,
 )
 
 
@@ -37,33 +53,468 @@ class Elf:
             elves.append(current_elf)
         return elves
 
+    @classmethod
+    def stream_top_elves(cls, filename: str, top: int = 3) -> List[Self]:
+        """Read the file once and only keep the `top` best running totals.
+
+        Memory is O(top): the individual calories are never stored, the returned elves carry their total as the
+        only `storage` value. Ties are broken like the sorted path: the earliest elf wins.
+        """
+        print(f'Streaming {filename}')
+        with open(filename, 'r') as f:
+            best, index, current_total = scan_totals(f, top)
+
+        if current_total > 0:
+            best.push(current_total, index)
+        return best.elves()
+
+
+@dataclasses.dataclass
+class TopTotals:
+    top: int = 3
+    # min-heap of (total, -index) so the smallest total - and the latest elf on ties - is evicted first
+    heap: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+
+    def __post_init__(self):
+        if self.top < 1:
+            raise ValueError(f'At least 1 elf must be kept, got top={self.top}')
+
+    def push(self, total: int, index: int):
+        if len(self.heap) < self.top:
+            heapq.heappush(self.heap, (total, -index))
+        elif (total, -index) > self.heap[0]:
+            heapq.heapreplace(self.heap, (total, -index))
+
+    def merge(self, other: Self, index_offset: int = 0):
+        for total, neg_index in other.heap:
+            self.push(total, index_offset - neg_index)
+
+    def elves(self) -> List[Elf]:
+        return [
+            Elf(f'elf_{-neg_index}', storage=[total])
+            for total, neg_index in sorted(self.heap, key=lambda e: (-e[0], -e[1]))
+        ]
+
+
+def scan_totals(lines: Iterable[str], top: int) -> Tuple[TopTotals, int, int]:
+    """Scan lines of calories, every blank line closes an elf.
+
+    :returns: the best closed elves, the number of closed elves and the total of the elf still open.
+    """
+    best = TopTotals(top)
+    index = 0
+    current_total = 0
+    for line in lines:
+        content = line.replace('\n', '')
+        if content:
+            current_total += int(content)
+        else:
+            best.push(current_total, index)
+            index += 1
+            current_total = 0
+    return best, index, current_total
+
 
 Elves = List[Elf]
 
 
+@dataclasses.dataclass
+class RankIndex:
+    """Sorted totals to answer rank, percentile and threshold queries without sorting again."""
+    # ascending totals
+    totals: array
+    # name -> rank, 1 is the most carrying elf
+    ranks: Dict[str, int]
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+    @classmethod
+    def from_elves(cls, elves: Elves) -> Self:
+        # same order as q1/q2: stable sort so ties keep the first elf first
+        ranked = sorted(elves, key=attrgetter('total_storage'), reverse=True)
+        return cls(
+            totals=array('q', reversed([e.total_storage for e in ranked])),
+            ranks={e.name: rank for rank, e in enumerate(ranked, start=1)},
+        )
+
+    def rank(self, name: str) -> int:
+        return self.ranks[name]
+
+    def count_above(self, threshold: int) -> int:
+        """Number of elves carrying strictly more than `threshold`."""
+        return len(self.totals) - bisect.bisect_right(self.totals, threshold)
+
+    def percentile(self, percent: float) -> int:
+        """Total carried by the elf at the `percent` percentile (nearest-rank method)."""
+        if not 0 < percent <= 100:
+            raise ValueError(f'Percentile {percent} is not in ]0, 100]')
+        if not self.totals:
+            raise ValueError('No elves')
+        # exact rank: with floats 7 / 100 * 100 is a little more than 7 and would round up to the next rank
+        return self.totals[math.ceil(Fraction(str(percent)) * len(self.totals) / 100) - 1]
+
+    def query(self, content: str) -> int:
+        """Answer a query written as `rank=<name>`, `above=<calories>` or `percentile=<percent>`."""
+        kind, _, value = content.partition('=')
+        try:
+            if kind == 'rank':
+                return self.rank(value)
+            elif kind == 'above':
+                return self.count_above(int(value))
+            elif kind == 'percentile':
+                return self.percentile(float(value))
+        except KeyError:
+            raise ValueError(f'Invalid query {content}: unknown elf {value}')
+        except ValueError as e:
+            raise ValueError(f'Invalid query {content}: {e}')
+        raise ValueError(f'Unexpected query: {content}')
+
+
+@dataclasses.dataclass
+class ElfTable:
+    """Columnar storage of all the elves: no python object per elf or per calorie.
+
+    Calories of `elf_i` are `values[offsets[i]:offsets[i + 1]]` and its total is `totals[i]`.
+    """
+    values: array = dataclasses.field(default_factory=lambda: array('q'))
+    offsets: array = dataclasses.field(default_factory=lambda: array('q', [0]))
+    totals: array = dataclasses.field(default_factory=lambda: array('q'))
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+    @staticmethod
+    def name(index: int) -> str:
+        return f'elf_{index}'
+
+    def storage(self, index: int) -> array:
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def total(self, index: int) -> int:
+        return self.totals[index]
+
+    def elf(self, index: int) -> Elf:
+        return Elf(self.name(index), storage=self.storage(index).tolist())
+
+    def ranking(self, top: int = None) -> List[int]:
+        # both are stable so ties keep the first elf, like sorting Elf objects
+        if top is not None:
+            return heapq.nlargest(top, range(len(self.totals)), key=self.totals.__getitem__)
+        return sorted(range(len(self.totals)), key=self.totals.__getitem__, reverse=True)
+
+    def max_index(self) -> int:
+        """Index of the most carrying elf, the first one on ties."""
+        return self.totals.index(max(self.totals))
+
+    def top_elves(self, top: int = 3) -> Elf:
+        ranked = self.ranking(top)
+        return Elf(
+            name=', '.join((self.name(i) for i in ranked)),
+            storage=[self.totals[i] for i in ranked],
+        )
+
+    def _close_elf(self):
+        start = self.offsets[-1]
+        self.offsets.append(len(self.values))
+        self.totals.append(sum(self.values[start:]))
+
+    @classmethod
+    def from_file(cls, filename: str) -> Self:
+        print(f'Loading {filename} as a table')
+        table = cls()
+        with open(filename, 'r') as f:
+            for line in f:
+                content = line.replace('\n', '')
+                if content:
+                    table.values.append(int(content))
+                else:
+                    table._close_elf()
+
+        # same as Elf.load_elves: a last elf carrying nothing is dropped
+        if sum(table.values[table.offsets[-1]:]) > 0:
+            table._close_elf()
+        else:
+            del table.values[table.offsets[-1]:]
+        return table
+
+
 def q1_max_carrying_elf(elves: Elves) -> Elf:
     return sorted(elves, key=attrgetter('total_storage'), reverse=True)[0]
 
 
 def q2_top_carrying_elves(elves: Elves, top=3) -> Elf:
     top_elves = sorted(elves, key=attrgetter('total_storage'), reverse=True)[:top]
+    return merge_elves(top_elves)
+
+
+def merge_elves(elves: Elves) -> Elf:
     # make a fake elf to simplify
     return Elf(
-        name=', '.join((e.name for e in top_elves)),
-        storage=[e.total_storage for e in top_elves],
+        name=', '.join((e.name for e in elves)),
+        storage=[e.total_storage for e in elves],
     )
 
 
+ELF_SEPARATOR = b'\n\n'
+
+
+def _find_separator_end(f, position: int) -> int:
+    """Position right after the first separator found from `position`, -1 if there is none.
+
+    Blocks are searched one by one, only the end of the previous block is kept in case the separator straddles them.
+    """
+    f.seek(position)
+    carry = b''
+    while block := f.read(64 * 1024):
+        buffer = carry + block
+        found = buffer.find(ELF_SEPARATOR)
+        if found != -1:
+            return position - len(carry) + found + len(ELF_SEPARATOR)
+        position += len(block)
+        carry = buffer[-(len(ELF_SEPARATOR) - 1):]
+    return -1
+
+
+def split_elf_ranges(filename: str, chunks: int) -> List[Tuple[int, int]]:
+    """Split the file in up to `chunks` byte ranges, each one starting on the first line of an elf."""
+    file_size = os.path.getsize(filename)
+    chunk_size = max(file_size // max(chunks, 1), 1)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        target = chunk_size
+        while target < file_size:
+            # the separator may straddle the target, so look from 1 byte before
+            boundary = _find_separator_end(f, target - 1)
+            if boundary == -1 or boundary >= file_size:
+                break
+            boundaries.append(boundary)
+            target = max(boundary, target + chunk_size)
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _range_lines(f, end: int) -> Iterable[str]:
+    while f.tell() < end:
+        line = f.readline()
+        if not line:
+            break
+        yield line.decode()
+
+
+def _scan_range(filename: str, start: int, end: int, top: int) -> Tuple[TopTotals, int, int]:
+    # ranges end after a separator so reading whole lines never crosses `end`
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        return scan_totals(_range_lines(f, end), top)
+
+
+def parallel_top_elves(filename: str, top: int = 3, workers: int = None, chunks: int = None) -> Elves:
+    """Same result as `Elf.stream_top_elves` but the ranges of the file are parsed in a process pool."""
+    workers = workers or os.cpu_count() or 1
+    ranges = split_elf_ranges(filename, chunks or workers * 4)
+    print(f'Loading {filename} in {len(ranges)} chunks with {workers} workers')
+
+    best = TopTotals(top)
+    index = 0
+    current_total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_scan_range, filename, start, end, top)
+            for start, end in ranges
+        ]
+        for future in futures:
+            # every range but the last one ends on a blank line so current_total is only kept for the last one
+            partial, closed, current_total = future.result()
+            best.merge(partial, index_offset=index)
+            index += closed
+
+    if current_total > 0:
+        best.push(current_total, index)
+    return best.elves()
+
+
+@dataclasses.dataclass
+class FollowState:
+    """Ranking state of a file that only grows: only the bytes appended since the last refresh are parsed."""
+    top: int = 3
+    # position after the last complete line that was parsed
+    offset: int = 0
+    # number of closed elves, i.e. index of the open one
+    index: int = 0
+    current_total: int = 0
+    best: TopTotals = None
+
+    def __post_init__(self):
+        if self.best is None:
+            self.best = TopTotals(self.top)
+
+    def refresh(self, filename: str) -> int:
+        """Parse what was appended to the file since the last call, returns the number of bytes parsed."""
+        if os.path.getsize(filename) < self.offset:
+            print(f'{filename} was truncated, starting again')
+            self.offset, self.index, self.current_total = 0, 0, 0
+            self.best = TopTotals(self.top)
+
+        with open(filename, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # a line still being written is left for the next refresh
+        complete = data.rfind(b'\n') + 1
+        for line in data[:complete].decode().split('\n')[:-1]:
+            if line:
+                self.current_total += int(line)
+            else:
+                self.best.push(self.current_total, self.index)
+                self.index += 1
+                self.current_total = 0
+        self.offset += complete
+        return complete
+
+    def top_elves(self) -> Elves:
+        # like at the end of the file: the open elf counts when it carries something
+        current = TopTotals(self.top, list(self.best.heap))
+        if self.current_total > 0:
+            current.push(self.current_total, self.index)
+        return current.elves()
+
+    def save(self, filename: str):
+        with open(filename, 'w') as f:
+            json.dump({
+                'top': self.top,
+                'offset': self.offset,
+                'index': self.index,
+                'current_total': self.current_total,
+                'heap': self.best.heap,
+            }, f)
+
+    @classmethod
+    def load(cls, filename: str, top: int) -> Self:
+        """Load the state saved in `filename`, or a new state if missing or saved for another `top`."""
+        if not os.path.exists(filename):
+            return cls(top)
+        with open(filename, 'r') as f:
+            content = json.load(f)
+        if content['top'] != top:
+            return cls(top)
+        return cls(
+            top=top,
+            offset=content['offset'],
+            index=content['index'],
+            current_total=content['current_total'],
+            best=TopTotals(top, [tuple(e) for e in content['heap']]),
+        )
+
+
+def follow(filename: str, top: int, state_file: Optional[str], interval: float):
+    """Print the answers each time data is appended to `filename`, optionally saving the state between runs."""
+    state = FollowState.load(state_file, top) if state_file else FollowState(top)
+    first = True
+    while True:
+        offset = state.offset
+        parsed = state.refresh(filename)
+        # the answers are always printed once, even when nothing was appended since the saved state
+        if parsed or first:
+            top_elves = state.top_elves()
+            if top_elves:
+                print_answers(top_elves[0], merge_elves(top_elves), top)
+        if state_file and (parsed or state.offset != offset):
+            state.save(state_file)
+        if not interval:
+            break
+        first = False
+        time.sleep(interval)
+
+
+def _run_loader(loader: Callable[[str], object], filename: str) -> Tuple[float, int, int]:
+    # ru_maxrss is in kiB on linux
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    start = time.perf_counter()
+    loader(filename)
+    elapsed = time.perf_counter() - start
+    return elapsed, start_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(loader: Callable[[str], object], filename: str) -> Tuple[float, int, int]:
+    """Run the loader in a fresh process.
+
+    :returns: the loading time in seconds, the peak RSS of the process and how much loading grew it, in bytes.
+    """
+    # spawn rather than fork so the peak RSS of this process is not inherited
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        elapsed, start_rss, peak_rss = pool.submit(_run_loader, loader, filename).result()
+    return elapsed, peak_rss, peak_rss - start_rss
+
+
+def benchmark(filename: str):
+    for label, loader in (
+        ('Elf.load_elves', Elf.load_elves),
+        ('ElfTable.from_file', ElfTable.from_file),
+    ):
+        elapsed, peak, growth = measure(loader, filename)
+        print(f'{label}: {elapsed * 1000.0:.2f}ms, peak RSS {peak / 1024.0:.1f}kiB (+{growth / 1024.0:.1f}kiB)')
+
+
+def benchmark_workers(filename: str, max_workers: int):
+    file_size = os.path.getsize(filename)
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        parallel_top_elves(filename, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f'{workers} workers: {elapsed * 1000.0:.2f}ms, {file_size / elapsed / 1024.0 / 1024.0:.2f}MiB/s')
+        workers *= 2
+
+
+def answers(filename: str, top: int, stream=False, table=False, workers=0) -> Tuple[Elf, Elf]:
+    if workers:
+        top_elves = parallel_top_elves(filename, max(top, 1), workers=workers)
+        return top_elves[0], merge_elves(top_elves[:top])
+    elif stream:
+        top_elves = Elf.stream_top_elves(filename, max(top, 1))
+        return top_elves[0], merge_elves(top_elves[:top])
+    elif table:
+        elf_table = ElfTable.from_file(filename)
+        return elf_table.elf(elf_table.max_index()), elf_table.top_elves(top)
+    else:
+        elves = Elf.load_elves(filename)
+        return q1_max_carrying_elf(elves), q2_top_carrying_elves(elves, top)
+
+
+def print_answers(q1: Elf, q2: Elf, top: int):
+    print(f'Most carrying elf is: {q1.name} carrying {q1.total_storage} cal')
+    print(f'Top {top} carrying elves are: {q2.name} carrying {q2.total_storage} cal')
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
     parser.add_argument('--q2-top', type=int, default=3, help='Top carrying elves')
+    parser.add_argument('--stream', action='store_true', default=False, help='Bounded memory top-k loading')
+    parser.add_argument('--table', action='store_true', default=False, help='Columnar loading')
+    parser.add_argument('--workers', type=int, default=0, help='Parse the file with a pool of processes')
+    parser.add_argument('--state', type=str, default=None, help='Incremental mode: state kept between runs')
+    parser.add_argument('--follow', type=float, default=0, help='Incremental mode: seconds between refreshes')
+    parser.add_argument('--benchmark', action='store_true', default=False, help='Compare the loaders')
+    sub_parsers = parser.add_subparsers(dest='command')
+    query_parser = sub_parsers.add_parser('query', help='Answer a batch of rank queries')
+    query_parser.add_argument(
+        'queries', type=str, nargs='+', help='rank=<elf name>, above=<calories> or percentile=<percent>',
+    )
     args = parser.parse_args()
 
-    elves = Elf.load_elves(args.input)
-
-    q1 = q1_max_carrying_elf(elves)
-    print(f'Most carrying elf is: {q1.name} carrying {q1.total_storage} cal')
+    if args.benchmark:
+        benchmark(args.input)
+        benchmark_workers(args.input, args.workers or os.cpu_count() or 1)
 
-    q2 = q2_top_carrying_elves(elves, args.q2_top)
-    print(f'Top {args.q2_top} carrying elves are: {q2.name} carrying {q2.total_storage} cal')
+    if args.command == 'query':
+        index = RankIndex.from_elves(Elf.load_elves(args.input))
+        for query in args.queries:
+            try:
+                print(f'{query}: {index.query(query)}')
+            except ValueError as e:
+                print(e)
+    elif args.state or args.follow:
+        follow(args.input, args.q2_top, args.state, args.follow)
+    else:
+        print_answers(*answers(args.input, args.q2_top, args.stream, args.table, args.workers), args.q2_top)
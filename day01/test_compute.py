@@ -4,8 +4,16 @@ import pytest
 
 from .compute import (
     Elf,
+    ElfTable,
+    FollowState,
+    RankIndex,
+    follow,
+    measure,
+    merge_elves,
+    parallel_top_elves,
     q1_max_carrying_elf,
     q2_top_carrying_elves,
+    split_elf_ranges,
 )
 
 
@@ -86,6 +94,235 @@ class TestElf:
         assert elf.total_storage == sum(content)
 
 
+class TestStreamTopElves:
+    def test_example(self, small_ex_txt):
+        top_elves = Elf.stream_top_elves(small_ex_txt)
+        assert [e.name for e in top_elves] == ['elf_3', 'elf_2', 'elf_4']
+        assert [e.total_storage for e in top_elves] == [24000, 11000, 10000]
+
+    def test_input(self, input_txt, input_elves):
+        top_elves = Elf.stream_top_elves(input_txt)
+        expected = q2_top_carrying_elves(input_elves)
+        assert merge_elves(top_elves) == expected
+
+    def test_ties_keep_first_elf(self, tmp_path):
+        tie_file = tmp_path / "ex1.txt"
+        tie_file.write_text("100\n\n200\n\n100\n\n200\n")
+
+        top_elves = Elf.stream_top_elves(tie_file, top=3)
+        assert [e.name for e in top_elves] == ['elf_1', 'elf_3', 'elf_0']
+
+    def test_empty(self, tmp_path):
+        empty_file = tmp_path / "ex1.txt"
+        empty_file.write_text("")
+
+        assert Elf.stream_top_elves(empty_file) == []
+
+    @pytest.mark.parametrize('top', (0, -1))
+    def test_invalid_top(self, small_ex_txt, top):
+        with pytest.raises(ValueError):
+            Elf.stream_top_elves(small_ex_txt, top=top)
+
+
+class TestParallelTopElves:
+    @pytest.mark.parametrize('chunks', (1, 2, 7))
+    def test_example(self, small_ex_txt, chunks):
+        assert parallel_top_elves(small_ex_txt, workers=2, chunks=chunks) == Elf.stream_top_elves(small_ex_txt)
+
+    @pytest.mark.parametrize('content', (
+        '',
+        '1000',
+        '\n\n\n1000\n\n\n\n2000\n3000\n\n4000\n\n',
+        '1000\n\n0\n',
+        '5\n\n5\n\n5\n\n5\n\n5\n\n5\n\n5\n\n5',
+    ))
+    def test_same_numbering(self, tmp_path, content):
+        simple_file = tmp_path / "ex1.txt"
+        simple_file.write_text(content)
+
+        for chunks in range(1, len(content) + 2):
+            assert parallel_top_elves(simple_file, top=5, workers=2, chunks=chunks) == \
+                Elf.stream_top_elves(simple_file, top=5), f'Failed with {chunks} chunks'
+
+    @pytest.mark.parametrize('prefix_size', (65534, 65535, 65536))
+    def test_separator_across_blocks(self, tmp_path, prefix_size):
+        long_file = tmp_path / "ex1.txt"
+        content = b'1' * prefix_size + b'\n\n2\n'
+        long_file.write_bytes(content)
+
+        assert split_elf_ranges(long_file, chunks=len(content)) == [
+            (0, prefix_size + 2),
+            (prefix_size + 2, len(content)),
+        ]
+
+    def test_input(self, input_txt, input_elves):
+        top_elves = parallel_top_elves(input_txt, workers=4)
+        assert merge_elves(top_elves) == q2_top_carrying_elves(input_elves)
+
+
+class TestFollowState:
+    def test_appended(self, tmp_path):
+        follow_file = tmp_path / "ex1.txt"
+        follow_file.write_text("1000\n2000\n\n500\n")
+        state = FollowState(top=2)
+
+        assert state.refresh(follow_file) == 15
+        assert [(e.name, e.total_storage) for e in state.top_elves()] == [('elf_0', 3000), ('elf_1', 500)]
+        assert state.refresh(follow_file) == 0
+
+        with open(follow_file, 'a') as f:
+            f.write("3000\n\n4000\n\n10")
+        # the last line is not complete yet
+        assert state.refresh(follow_file) == 12
+        assert [(e.name, e.total_storage) for e in state.top_elves()] == [('elf_2', 4000), ('elf_1', 3500)]
+
+        with open(follow_file, 'a') as f:
+            f.write("000\n")
+        state.refresh(follow_file)
+        assert [(e.name, e.total_storage) for e in state.top_elves()] == [('elf_3', 10000), ('elf_2', 4000)]
+
+    def test_save_load(self, tmp_path, input_txt, input_elves):
+        state_file = tmp_path / "state.json"
+        follow_file = tmp_path / "ex1.txt"
+        with open(input_txt, 'r') as f:
+            content = f.read()
+        middle = len(content) // 2
+
+        follow_file.write_text(content[:middle])
+        state = FollowState.load(state_file, 3)
+        state.refresh(follow_file)
+        state.save(state_file)
+
+        follow_file.write_text(content)
+        state = FollowState.load(state_file, 3)
+        assert state.offset > 0
+        state.refresh(follow_file)
+        assert merge_elves(state.top_elves()) == q2_top_carrying_elves(input_elves)
+
+        # saved for another top
+        assert FollowState.load(state_file, 4).offset == 0
+
+    def test_truncated(self, tmp_path):
+        follow_file = tmp_path / "ex1.txt"
+        follow_file.write_text("1000\n2000\n\n500\n")
+        state = FollowState(top=2)
+        state.refresh(follow_file)
+
+        follow_file.write_text("1\n")
+        state.refresh(follow_file)
+        assert [(e.name, e.total_storage) for e in state.top_elves()] == [('elf_0', 1)]
+
+    def test_follow_prints_without_new_data(self, tmp_path, capsys):
+        state_file = tmp_path / "state.json"
+        follow_file = tmp_path / "ex1.txt"
+        follow_file.write_text("1000\n2000\n\n500\n")
+
+        follow(follow_file, 2, state_file, 0)
+        first_output = capsys.readouterr().out
+        saved = state_file.stat().st_mtime_ns
+        assert 'elf_0 carrying 3000 cal' in first_output
+
+        # nothing was appended: same answers and the state is not saved again
+        follow(follow_file, 2, state_file, 0)
+        assert capsys.readouterr().out == first_output
+        assert state_file.stat().st_mtime_ns == saved
+
+
+class TestRankIndex:
+    def test_rank(self, small_ex_elves):
+        index = RankIndex.from_elves(small_ex_elves)
+        assert [index.rank(f'elf_{i}') for i in range(5)] == [4, 5, 2, 1, 3]
+
+    @pytest.mark.parametrize('threshold, expected', (
+        (0, 5),
+        (4000, 4),
+        (10000, 2),
+        (10001, 2),
+        (24000, 0),
+    ))
+    def test_count_above(self, small_ex_elves, threshold, expected):
+        assert RankIndex.from_elves(small_ex_elves).count_above(threshold) == expected
+
+    @pytest.mark.parametrize('percent, expected', (
+        (1, 4000),
+        (20, 4000),
+        (50, 10000),
+        (99, 24000),
+        (100, 24000),
+    ))
+    def test_percentile(self, small_ex_elves, percent, expected):
+        assert RankIndex.from_elves(small_ex_elves).percentile(percent) == expected
+
+    @pytest.mark.parametrize('percent', (0, 101))
+    def test_percentile_invalid(self, small_ex_elves, percent):
+        with pytest.raises(ValueError):
+            RankIndex.from_elves(small_ex_elves).percentile(percent)
+
+    @pytest.mark.parametrize('percent', (1, 7, 14, 28, 56, 57, 99, 100, 7.0))
+    def test_percentile_exact_rank(self, percent):
+        index = RankIndex.from_elves([Elf(f'elf_{i}', storage=[i]) for i in range(1, 101)])
+        assert index.percentile(percent) == int(percent)
+        assert index.query(f'percentile={percent}') == int(percent)
+
+    def test_query(self, input_elves):
+        index = RankIndex.from_elves(input_elves)
+        assert index.query('rank=elf_79') == 2
+        assert index.query('above=70000') == 1
+        assert index.query('percentile=100') == 70509
+        with pytest.raises(ValueError):
+            index.query('median')
+
+    @pytest.mark.parametrize('query', ('rank=nobody', 'above=abc', 'percentile=abc', 'percentile=0'))
+    def test_query_invalid(self, small_ex_elves, query):
+        with pytest.raises(ValueError, match=f'Invalid query {query}'):
+            RankIndex.from_elves(small_ex_elves).query(query)
+
+
+class TestElfTable:
+    def test_from_file(self, small_ex_txt, small_ex_elves):
+        table = ElfTable.from_file(small_ex_txt)
+
+        assert len(table) == len(small_ex_elves)
+        for i, elf in enumerate(small_ex_elves):
+            assert table.elf(i) == elf
+            assert table.total(i) == elf.total_storage
+
+    @pytest.mark.parametrize('content, expected', (
+        ('', []),
+        ('1000', [1000]),
+        ('1000\n\n\n2000\n', [1000, 0, 2000]),
+        ('1000\n\n0\n', [1000]),
+    ))
+    def test_totals(self, tmp_path, content, expected):
+        simple_file = tmp_path / "ex1.txt"
+        simple_file.write_text(content)
+
+        table = ElfTable.from_file(simple_file)
+        assert table.totals.tolist() == expected
+        assert table.totals.tolist() == [e.total_storage for e in Elf.load_elves(simple_file)]
+
+    def test_input(self, input_txt, input_elves):
+        table = ElfTable.from_file(input_txt)
+        assert table.elf(table.max_index()) == q1_max_carrying_elf(input_elves)
+        assert table.top_elves() == q2_top_carrying_elves(input_elves)
+
+    def test_ranking_ties(self, tmp_path):
+        tie_file = tmp_path / "ex1.txt"
+        tie_file.write_text("100\n\n200\n\n100\n\n200\n")
+
+        table = ElfTable.from_file(tie_file)
+        assert table.max_index() == 1
+        assert table.ranking() == [1, 3, 0, 2]
+        for top in range(1, 6):
+            assert table.ranking(top) == table.ranking()[:top]
+
+    def test_measure(self, small_ex_txt):
+        elapsed, peak, growth = measure(ElfTable.from_file, small_ex_txt)
+        assert elapsed > 0
+        assert peak > 0
+        assert 0 <= growth <= peak
+
+
 class TestQuestion1:
     def test_example(self, small_ex_elves):
         most = q1_max_carrying_elf(small_ex_elves)
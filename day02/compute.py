@@ -1,11 +1,17 @@
+import time
 from argparse import ArgumentParser
+from collections import Counter
 from enum import IntEnum
+from itertools import permutations
 from typing import (
     Callable,
     Dict,
+    Iterable,
+    Iterator,
     List,
     Self,
     Tuple,
+    Union,
 )
 
 
@@ -62,19 +68,20 @@ class Action(IntEnum):
     @classmethod
     def from_input_q2(cls, opponent: str, selected: str) -> Pair:
         adversary = cls.from_input(opponent)
-        result = Result.from_input(selected)
+        return adversary, cls.for_result(adversary, Result.from_input(selected))
 
+    @classmethod
+    def for_result(cls, adversary: Self, result: Result) -> Self:
+        """Action to play against `adversary` to get `result`."""
         if result == Result.Draw:
-            choice = adversary
+            return adversary
         elif result == Result.Lose:
-            choice = _win_matrix[adversary]
+            return _win_matrix[adversary]
         elif result == Result.Win:
-            choice = _rev_win_matrix[adversary]
+            return _rev_win_matrix[adversary]
         else:
             raise NotImplementedError()
 
-        return adversary, choice
-
     @classmethod
     def from_file(cls, filename: str, q1=True) -> Game:
         print(f'Loading from {filename} using q1={q1}')
@@ -92,6 +99,31 @@ class Action(IntEnum):
 
         return game
 
+    @classmethod
+    def read_rounds(cls, filename: str) -> Iterator[Tuple[str, str]]:
+        """Lazily yield the raw (opponent, selected) columns of each line."""
+        print(f'Streaming from {filename}')
+        with open(filename, 'r') as f:
+            for line in f:
+                opponent, selected = line.replace('\n', '').split(' ')
+                yield opponent, selected
+
+    @classmethod
+    def play_both(cls, rounds: Iterable[Tuple[str, str]]) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Same as `play` for both the q1 and q2 interpretation of the rounds, consumed only once."""
+        q1_scores = [0, 0]
+        q2_scores = [0, 0]
+        interpretations = (
+            (q1_scores, cls.from_input_q1),
+            (q2_scores, cls.from_input_q2),
+        )
+        for opponent, selected in rounds:
+            for scores, loader in interpretations:
+                adversary, choice = loader(opponent, selected)
+                scores[0] += choice.round(adversary)
+                scores[1] += adversary.round(choice)
+        return tuple(q1_scores), tuple(q2_scores)
+
     @classmethod
     def play(cls, game: Game) -> Tuple[int, int]:
         score = 0
@@ -145,15 +177,141 @@ _rev_win_matrix = {
 }
 
 
+def _scores(pair: Pair) -> Tuple[int, int]:
+    opponent, selected = pair
+    return selected.round(opponent), opponent.round(selected)
+
+
+# input line -> (score, opponent score) for q1 and q2
+_q1_score_table: Dict[str, Tuple[int, int]] = {
+    f'{opponent.output} {selected}': _scores(Action.from_input_q1(opponent.output, selected))
+    for opponent in Action
+    for selected in ('X', 'Y', 'Z')
+}
+_q2_score_table: Dict[str, Tuple[int, int]] = {
+    f'{opponent.output} {selected}': _scores(Action.from_input_q2(opponent.output, selected))
+    for opponent in Action
+    for selected in ('X', 'Y', 'Z')
+}
+
+
+def count_rounds(filename: str) -> Dict[str, int]:
+    """Histogram of the input lines: there are only 9 possible rounds."""
+    print(f'Counting rounds from {filename}')
+    with open(filename, 'rb') as f:
+        counts = Counter(f)
+    histogram = Counter()
+    for line, count in counts.items():
+        histogram[line.decode().replace('\n', '')] += count
+    return histogram
+
+
+def score_rounds(histogram: Dict[str, int], q1=True) -> Tuple[int, int]:
+    """Same result as `Action.play` from the histogram of `count_rounds`."""
+    score_table = _q1_score_table if q1 else _q2_score_table
+    score = 0
+    other_score = 0
+    for line, count in histogram.items():
+        if line not in score_table:
+            raise ValueError(f'Unexpected round: {line}')
+        selected_score, opponent_score = score_table[line]
+        score += selected_score * count
+        other_score += opponent_score * count
+    return score, other_score
+
+
+# decoding of the X, Y, Z column: either as actions or as results
+Strategy = Dict[str, Union[Action, Result]]
+
+
+def all_strategies() -> List[Strategy]:
+    columns = ('X', 'Y', 'Z')
+    return [
+        dict(zip(columns, values))
+        for kind in (Action, Result)
+        for values in permutations(kind)
+    ]
+
+
+def strategy_name(strategy: Strategy) -> str:
+    return ','.join(f'{k}={v.name}' for k, v in sorted(strategy.items()))
+
+
+def _strategy_scores(opponent: Action, decoded: Union[Action, Result]) -> Tuple[int, int]:
+    if isinstance(decoded, Result):
+        selected = Action.for_result(opponent, decoded)
+    else:
+        selected = decoded
+    return selected.round(opponent), opponent.round(selected)
+
+
+def sweep_strategies(histogram: Dict[str, int]) -> List[Tuple[Strategy, int, int]]:
+    """Score of every strategy from the histogram of `count_rounds`: 9 lookups per strategy."""
+    rounds = []
+    for line, count in histogram.items():
+        opponent, selected = line.split(' ')
+        rounds.append((Action.from_input(opponent), selected, count))
+
+    results = []
+    for strategy in all_strategies():
+        score = 0
+        other_score = 0
+        for opponent, selected, count in rounds:
+            selected_score, opponent_score = _strategy_scores(opponent, strategy[selected])
+            score += selected_score * count
+            other_score += opponent_score * count
+        results.append((strategy, score, other_score))
+    return results
+
+
+def sweep_strategies_naive(filename: str) -> List[Tuple[Strategy, int, int]]:
+    """Reference implementation: read and play the whole file once per strategy."""
+    results = []
+    for strategy in all_strategies():
+        score = 0
+        other_score = 0
+        for opponent, selected in Action.read_rounds(filename):
+            selected_score, opponent_score = _strategy_scores(Action.from_input(opponent), strategy[selected])
+            score += selected_score
+            other_score += opponent_score
+        results.append((strategy, score, other_score))
+    return results
+
+
+def benchmark_sweep(filename: str):
+    start = time.perf_counter()
+    sweep_strategies_naive(filename)
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sweep_strategies(count_rounds(filename))
+    histogram = time.perf_counter() - start
+    print(f'Naive sweep: {naive * 1000.0:.2f}ms, histogram sweep: {histogram * 1000.0:.2f}ms')
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--histogram', action='store_true', default=False, help='Score from a histogram of rounds')
+    parser.add_argument('--sweep', action='store_true', default=False, help='Score every decoding of X, Y, Z')
+    parser.add_argument('--benchmark', action='store_true', default=False, help='Benchmark the sweep')
     args = parser.parse_args()
 
-    q1_game = Action.from_file(args.input)
-    q1_score, q1_opponent = Action.play(q1_game)
-    print(f'q1: score is {q1_score} (opponent: {q1_opponent})')
+    if args.sweep:
+        sweep = sorted(sweep_strategies(count_rounds(args.input)), key=lambda r: r[1])
+        for strategy, score, other_score in sweep:
+            print(f'{strategy_name(strategy)}: score is {score} (opponent: {other_score})')
+        print(f'Best strategy: {strategy_name(sweep[-1][0])} with {sweep[-1][1]}')
+        print(f'Worst strategy: {strategy_name(sweep[0][0])} with {sweep[0][1]}')
+    if args.benchmark:
+        benchmark_sweep(args.input)
 
-    q2_game = Action.from_file(args.input, q1=False)
-    q2_score, q2_opponent = Action.play(q2_game)
+    if args.histogram:
+        rounds = count_rounds(args.input)
+        q1_score, q1_opponent = score_rounds(rounds)
+        q2_score, q2_opponent = score_rounds(rounds, q1=False)
+    else:
+        (q1_score, q1_opponent), (q2_score, q2_opponent) = Action.play_both(Action.read_rounds(args.input))
+
+    print(f'q1: score is {q1_score} (opponent: {q1_opponent})')
     print(f'q2: score is {q2_score} (opponent: {q2_opponent})')
@@ -5,6 +5,11 @@ import pytest
 from .compute import (
     Action,
     Result,
+    all_strategies,
+    count_rounds,
+    score_rounds,
+    sweep_strategies,
+    sweep_strategies_naive,
 )
 
 
@@ -87,6 +92,53 @@ class TestAction:
         ) == (b, a), f'{b.name} for {state.name} should mean {a.name}'
 
 
+class TestPlayBoth:
+    def test_read_rounds(self, small_ex_txt):
+        assert list(Action.read_rounds(small_ex_txt)) == [('A', 'Y'), ('B', 'X'), ('C', 'Z')]
+
+    def test_small_ex(self, small_ex_txt):
+        assert Action.play_both(Action.read_rounds(small_ex_txt)) == ((15, 15), (12, 15))
+
+    def test_input(self, input_txt):
+        assert Action.play_both(Action.read_rounds(input_txt)) == ((15691, 8832), (12989, 11295))
+
+
+class TestHistogram:
+    def test_count_rounds(self, small_ex_txt):
+        assert count_rounds(small_ex_txt) == {'A Y': 1, 'B X': 1, 'C Z': 1}
+
+    @pytest.mark.parametrize('q1', (True, False))
+    def test_small_ex(self, small_ex_txt, q1):
+        assert score_rounds(count_rounds(small_ex_txt), q1=q1) == Action.play(Action.from_file(small_ex_txt, q1=q1))
+
+    @pytest.mark.parametrize('q1', (True, False))
+    def test_input(self, input_txt, q1):
+        assert score_rounds(count_rounds(input_txt), q1=q1) == Action.play(Action.from_file(input_txt, q1=q1))
+
+    def test_unexpected_round(self):
+        with pytest.raises(ValueError):
+            score_rounds({'A W': 1})
+
+
+class TestSweep:
+    def test_all_strategies(self):
+        strategies = all_strategies()
+        assert len(strategies) == 12
+        assert {'X': Action.Rock, 'Y': Action.Paper, 'Z': Action.Scissor} in strategies
+        assert {'X': Result.Lose, 'Y': Result.Draw, 'Z': Result.Win} in strategies
+
+    def test_same_as_questions(self, input_txt):
+        sweep = {
+            tuple(strategy.values()): (score, other_score)
+            for strategy, score, other_score in sweep_strategies(count_rounds(input_txt))
+        }
+        assert sweep[(Action.Rock, Action.Paper, Action.Scissor)] == (15691, 8832)
+        assert sweep[(Result.Lose, Result.Draw, Result.Win)] == (12989, 11295)
+
+    def test_same_as_naive(self, small_ex_txt):
+        assert sweep_strategies(count_rounds(small_ex_txt)) == sweep_strategies_naive(small_ex_txt)
+
+
 class TestQuestion1:
     def test_example(self, small_ex_game_q1):
         assert Action.play(small_ex_game_q1) == (15, 15)
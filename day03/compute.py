@@ -1,14 +1,25 @@
 import dataclasses
+import time
 from argparse import ArgumentParser
+from array import array
+from string import ascii_letters
 from typing import (
     Dict,
+    Iterable,
     List,
     Optional,
     Self,
     Set,
     Tuple,
+    Type,
+    Union,
 )
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for RucksackBatch
+    np = None
+
 
 def item_priority(item: str) -> int:
     upper_a = ord('A')  # ascii value of A - 65
@@ -21,6 +32,29 @@ def item_priority(item: str) -> int:
     return (value - lower_a) + 1  # lowercase 1 to 26
 
 
+# item -> mask with the bit at the item's priority set
+_item_masks: Dict[str, int] = {
+    item: 1 << item_priority(item)
+    for item in ascii_letters
+}
+
+
+def mask_items(mask: int) -> Iterable[str]:
+    for item, item_mask in _item_masks.items():
+        if mask & item_mask:
+            yield item
+
+
+def mask_priority(mask: int) -> int:
+    """Sum of the priorities of the items in the mask."""
+    priorities = 0
+    while mask:
+        lowest = mask & -mask
+        priorities += lowest.bit_length() - 1
+        mask ^= lowest
+    return priorities
+
+
 @dataclasses.dataclass(repr=False)
 class Compartment:
     # dict[item -> number of items]
@@ -35,6 +69,13 @@ class Compartment:
     def unique_items(self) -> Set[str]:
         return set(self.content.keys())
 
+    @property
+    def mask(self) -> int:
+        mask = 0
+        for item in self.content:
+            mask |= _item_masks[item]
+        return mask
+
     def __str__(self) -> str:
         return ''.join(sorted([
             k * v
@@ -58,30 +99,73 @@ class Compartment:
         return first, second
 
 
+@dataclasses.dataclass(repr=False)
+class MaskCompartment:
+    """Only keeps which items are present: bit `item_priority(item)` of `mask` is set for each item."""
+    mask: int = 0
+
+    def add(self, item: str):
+        self.mask |= _item_masks[item]
+
+    def unique_items(self) -> Set[str]:
+        return set(mask_items(self.mask))
+
+    def __str__(self) -> str:
+        return ''.join(sorted(mask_items(self.mask)))
+
+    def common(self, other: Self) -> Optional[str]:
+        intersection = self.mask & other.mask
+        if intersection:
+            return ''.join(mask_items(intersection))
+
+    @classmethod
+    def from_string(cls, value: str) -> Tuple[Self, Self]:
+        first = 0
+        second = 0
+        middle = len(value) // 2
+        for item in value[:middle]:
+            first |= _item_masks[item]
+        for item in value[middle:]:
+            second |= _item_masks[item]
+        return cls(first), cls(second)
+
+
+AnyCompartment = Union[Compartment, MaskCompartment]
+
+
 @dataclasses.dataclass
 class Rucksack:
-    compartment_1: Compartment
-    compartment_2: Compartment
+    compartment_1: AnyCompartment
+    compartment_2: AnyCompartment
 
     def common_priority(self) -> int:
-        common = self.compartment_1.common(self.compartment_2)
-        if common:
-            # The question says there should only be 1 in common...
-            return sum((item_priority(c) for c in common))
-        return 0
+        # The question says there should only be 1 in common...
+        return mask_priority(self.compartment_1.mask & self.compartment_2.mask)
 
     def unique_items(self) -> Set[str]:
         return self.compartment_1.unique_items().union(self.compartment_2.unique_items())
 
+    @property
+    def mask(self) -> int:
+        return self.compartment_1.mask | self.compartment_2.mask
+
     @classmethod
-    def from_file(cls, filename: str) -> List[Self]:
+    def from_file(
+        cls,
+        filename: str,
+        compartment_cls: Type[AnyCompartment] = Compartment,
+        index: 'ItemIndex' = None,
+    ) -> List[Self]:
         print(f'Loading {filename}')
         rucksacks = []
         with open(filename, 'r') as f:
             for line in f:
                 content = line.replace('\n', '')
                 if content:  # handle empty last line
-                    rucksacks.append(cls(*Compartment.from_string(content)))
+                    rucksack = cls(*compartment_cls.from_string(content))
+                    if index is not None:
+                        index.add(len(rucksacks), rucksack)
+                    rucksacks.append(rucksack)
         return rucksacks
 
     @classmethod
@@ -93,6 +177,79 @@ class Rucksack:
         if len(content) == 1:
             return ''.join(content)
 
+    @classmethod
+    def find_badge_priority(cls, rucksacks: List[Self]) -> int:
+        content = rucksacks[0].mask
+        for rucksack in rucksacks[1:]:
+            content &= rucksack.mask
+        # there should be only 1
+        if content.bit_count() != 1:
+            raise ValueError(f'Expected a single badge, got {"".join(mask_items(content))!r}')
+        return content.bit_length() - 1
+
+
+@dataclasses.dataclass
+class ItemIndex:
+    """Inverted index: item -> sorted ids (position in the file) of the rucksacks containing it."""
+    postings: Dict[str, array] = dataclasses.field(default_factory=dict)
+    size: int = 0
+
+    def add(self, rucksack_id: int, rucksack: Rucksack):
+        # ids are added in increasing order so postings stay sorted
+        for item in mask_items(rucksack.mask):
+            if item not in self.postings:
+                self.postings[item] = array('l')
+            self.postings[item].append(rucksack_id)
+        self.size = max(self.size, rucksack_id + 1)
+
+    def rucksacks_with(self, item: str) -> array:
+        return self.postings.get(item, array('l'))
+
+    def rucksacks_with_all(self, items: Iterable[str]) -> array:
+        """Rucksacks containing all the items, starting the intersection with the rarest item."""
+        postings = sorted((self.rucksacks_with(item) for item in items), key=len)
+        if not postings:
+            return array('l', range(self.size))
+        result = postings[0]
+        for other in postings[1:]:
+            result = self._intersect(result, other)
+        return result
+
+    @staticmethod
+    def _intersect(a: array, b: array) -> array:
+        result = array('l')
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                result.append(a[i])
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def items_in_at_least(self, count: int) -> List[str]:
+        return sorted(
+            (item for item, ids in self.postings.items() if len(ids) >= count),
+            key=item_priority,
+        )
+
+    def groups_sharing(self, group_size: int) -> Dict[int, str]:
+        """Items shared by all the rucksacks of each group (`id // group_size`), like badges for q2."""
+        groups: Dict[int, str] = {}
+        for item in sorted(self.postings, key=item_priority):
+            counts: Dict[int, int] = {}
+            for rucksack_id in self.postings[item]:
+                group = rucksack_id // group_size
+                counts[group] = counts.get(group, 0) + 1
+            for group, count in counts.items():
+                # the last group may be smaller
+                if count == min(group_size, self.size - group * group_size):
+                    groups[group] = groups.get(group, '') + item
+        return dict(sorted(groups.items()))
+
 
 def q1_priorities(rucksacks: List[Rucksack]) -> int:
     return sum((rucksack.common_priority() for rucksack in rucksacks))
@@ -101,18 +258,124 @@ def q1_priorities(rucksacks: List[Rucksack]) -> int:
 def q2_badges(rucksacks: List[Rucksack], group_size=3) -> int:
     priorities = 0
     for st in range(0, len(rucksacks), group_size):
-        badge = Rucksack.find_badge(rucksacks[st:st + group_size])
-        # print(f'Group {st // 3} has badge {badge}')
-        priorities += item_priority(badge)
+        priorities += Rucksack.find_badge_priority(rucksacks[st:st + group_size])
     return priorities
 
 
+@dataclasses.dataclass
+class RucksackBatch:
+    """All the rucksacks as arrays of uint64 masks, one entry per non-empty line: requires numpy."""
+    compartment_1: 'np.ndarray'
+    compartment_2: 'np.ndarray'
+
+    def __len__(self) -> int:
+        return len(self.compartment_1)
+
+    @staticmethod
+    def _mask_table() -> 'np.ndarray':
+        table = np.zeros(256, dtype=np.uint64)
+        for item, item_mask in _item_masks.items():
+            table[ord(item)] = item_mask
+        return table
+
+    @staticmethod
+    def masks_priority(masks: 'np.ndarray') -> int:
+        """Sum of `mask_priority` over the array."""
+        priorities = 0
+        for priority in range(1, len(_item_masks) + 1):
+            priorities += priority * int(np.count_nonzero(masks & np.uint64(1 << priority)))
+        return priorities
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Self:
+        if np is None:
+            raise RuntimeError('RucksackBatch requires numpy')
+        content = np.frombuffer(data, dtype=np.uint8)
+        # newline and unknown bytes have an empty mask
+        masks = cls._mask_table()[content]
+
+        ends = np.flatnonzero(content == ord('\n'))
+        if not data.endswith(b'\n'):
+            ends = np.append(ends, len(data))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        non_empty = ends > starts  # handle empty lines
+        starts, ends = starts[non_empty], ends[non_empty]
+        if not len(starts):
+            empty = np.zeros(0, dtype=np.uint64)
+            return cls(empty, empty)
+        middles = starts + (ends - starts) // 2
+
+        # reduce [start, middle) and [middle, next start): what is after the end of a line is masked out anyway
+        boundaries = np.empty(len(starts) * 2, dtype=np.int64)
+        boundaries[0::2] = starts
+        boundaries[1::2] = middles
+        halves = np.bitwise_or.reduceat(masks, boundaries)
+        # reduceat gives masks[start] rather than nothing on an empty first half
+        first = np.where(middles > starts, halves[0::2], np.uint64(0))
+        return cls(first, halves[1::2])
+
+    @classmethod
+    def from_file(cls, filename: str) -> Self:
+        print(f'Loading {filename} as a batch')
+        with open(filename, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def q1_priorities(self) -> int:
+        return self.masks_priority(self.compartment_1 & self.compartment_2)
+
+    def q2_badges(self, group_size=3) -> int:
+        rucksacks = self.compartment_1 | self.compartment_2
+        full = len(rucksacks) // group_size * group_size
+        badges = np.bitwise_and.reduce(rucksacks[:full].reshape(-1, group_size), axis=1)
+        if full < len(rucksacks):
+            # the last group is smaller
+            badges = np.append(badges, np.bitwise_and.reduce(rucksacks[full:]))
+        # there should be only 1 per group
+        single = (badges != 0) & ((badges & (badges - np.uint64(1))) == 0)
+        if not single.all():
+            bad = int(np.flatnonzero(~single)[0])
+            raise ValueError(f'Expected a single badge, got {"".join(mask_items(int(badges[bad])))!r}')
+        return self.masks_priority(badges)
+
+
+def benchmark(filename: str):
+    for label, loader in (
+        ('Compartment', lambda: Rucksack.from_file(filename)),
+        ('MaskCompartment', lambda: Rucksack.from_file(filename, MaskCompartment)),
+    ):
+        start = time.perf_counter()
+        rucksacks = loader()
+        q1_priorities(rucksacks)
+        q2_badges(rucksacks)
+        elapsed = time.perf_counter() - start
+        print(f'{label}: {len(rucksacks) / elapsed:.0f} lines/s')
+
+    if np is not None:
+        start = time.perf_counter()
+        batch = RucksackBatch.from_file(filename)
+        batch.q1_priorities()
+        batch.q2_badges()
+        elapsed = time.perf_counter() - start
+        print(f'RucksackBatch: {len(batch) / elapsed:.0f} lines/s')
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--mask', action='store_true', default=False, help='Use bitmask compartments')
+    parser.add_argument('--batch', action='store_true', default=False, help='Use numpy arrays of masks')
+    parser.add_argument('--benchmark', action='store_true', default=False, help='Compare the throughput')
     args = parser.parse_args()
 
-    loaded = Rucksack.from_file(args.input)
+    if args.benchmark:
+        benchmark(args.input)
+
+    if args.batch:
+        batch = RucksackBatch.from_file(args.input)
+        print(f'Q1 rucksacks priorities: {batch.q1_priorities()}')
+        print(f'Q2 badges priories: {batch.q2_badges()}')
+    else:
+        loaded = Rucksack.from_file(args.input, MaskCompartment if args.mask else Compartment)
 
-    print(f'Q1 rucksacks priorities: {q1_priorities(loaded)}')
-    print(f'Q2 badges priories: {q2_badges(loaded)}')
+        print(f'Q1 rucksacks priorities: {q1_priorities(loaded)}')
+        print(f'Q2 badges priories: {q2_badges(loaded)}')
@@ -6,8 +6,12 @@ import pytest
 
 from .compute import (
     Compartment,
+    ItemIndex,
+    MaskCompartment,
     Rucksack,
+    RucksackBatch,
     item_priority,
+    mask_priority,
     q1_priorities,
     q2_badges,
 )
@@ -39,6 +43,13 @@ def input_rucksacks(input_txt) -> List[Rucksack]:
     return Rucksack.from_file(input_txt)
 
 
+@pytest.fixture(scope='session')
+def small_ex_index(small_ex_txt) -> ItemIndex:
+    index = ItemIndex()
+    Rucksack.from_file(small_ex_txt, MaskCompartment, index=index)
+    return index
+
+
 class TestItemPriority:
 
     def test_lowercase(self):
@@ -60,6 +71,35 @@ class TestCompartment:
         assert str(b) == ''.join(sorted('hcsFMMfFFhFp'))
 
 
+class TestMaskCompartment:
+
+    def test_from_string(self):
+        content = 'vJrwpWtwJgWrhcsFMMfFFhFp'
+        a, b = MaskCompartment.from_string(content)
+
+        assert str(a) == ''.join(sorted(set('vJrwpWtwJgWr')))
+        assert str(b) == ''.join(sorted(set('hcsFMMfFFhFp')))
+        assert a.common(b) == 'p'
+
+    def test_same_as_compartment(self, small_ex_rucksacks):
+        for rucksack in small_ex_rucksacks:
+            a, b = MaskCompartment(rucksack.compartment_1.mask), MaskCompartment(rucksack.compartment_2.mask)
+            assert a.unique_items() == rucksack.compartment_1.unique_items()
+            assert a.common(b) == rucksack.compartment_1.common(rucksack.compartment_2)
+
+    @pytest.mark.parametrize('items, expected', (
+        ('', 0),
+        ('a', 1),
+        ('Z', 52),
+        ('aZ', 53),
+    ))
+    def test_mask_priority(self, items, expected):
+        compartment = MaskCompartment()
+        for item in items:
+            compartment.add(item)
+        assert mask_priority(compartment.mask) == expected
+
+
 class TestRucksack:
 
     def test_small_ex_common(self, small_ex_rucksacks):
@@ -84,6 +124,94 @@ class TestRucksack:
         assert Rucksack.find_badge(group_a) == 'r'
         assert Rucksack.find_badge(group_b) == 'Z'
 
+    def test_find_badge_priority(self, small_ex_rucksacks):
+        assert Rucksack.find_badge_priority(small_ex_rucksacks[:3]) == 18
+        assert Rucksack.find_badge_priority(small_ex_rucksacks[3:]) == 52
+        with pytest.raises(ValueError):
+            Rucksack.find_badge_priority(small_ex_rucksacks[:2])
+
+    def test_mask_rucksacks(self, small_ex_txt):
+        rucksacks = Rucksack.from_file(small_ex_txt, MaskCompartment)
+        assert [r.compartment_1.common(r.compartment_2) for r in rucksacks] == list('pLPvts')
+        assert Rucksack.find_badge(rucksacks[:3]) == 'r'
+
+
+class TestItemIndex:
+
+    def test_rucksacks_with(self, small_ex_index, small_ex_rucksacks):
+        assert small_ex_index.size == 6
+        for item in 'prZQ':
+            assert small_ex_index.rucksacks_with(item).tolist() == [
+                i for i, r in enumerate(small_ex_rucksacks) if item in r.unique_items()
+            ]
+
+    def test_rucksacks_with_all(self, small_ex_index):
+        assert small_ex_index.rucksacks_with_all('r').tolist() == [0, 1, 2, 5]
+        assert small_ex_index.rucksacks_with_all('rZ').tolist() == [1, 5]
+        assert small_ex_index.rucksacks_with_all('rZx').tolist() == []
+        assert small_ex_index.rucksacks_with_all('').tolist() == list(range(6))
+
+    def test_items_in_at_least(self, small_ex_index, small_ex_rucksacks):
+        assert small_ex_index.items_in_at_least(6) == []
+        assert small_ex_index.items_in_at_least(4) == [
+            item
+            for item in sorted(set.union(*(r.unique_items() for r in small_ex_rucksacks)), key=item_priority)
+            if sum(item in r.unique_items() for r in small_ex_rucksacks) >= 4
+        ]
+
+    def test_groups_sharing(self, small_ex_index, small_ex_rucksacks):
+        assert small_ex_index.groups_sharing(3) == {0: 'r', 1: 'Z'}
+        # smaller last group
+        last_group = small_ex_rucksacks[4].unique_items() & small_ex_rucksacks[5].unique_items()
+        assert small_ex_index.groups_sharing(4)[1] == ''.join(sorted(last_group, key=item_priority))
+
+    def test_input(self, input_txt, input_rucksacks):
+        index = ItemIndex()
+        Rucksack.from_file(input_txt, index=index)
+        badges = index.groups_sharing(3)
+        assert len(badges) == len(input_rucksacks) // 3
+        assert sum(item_priority(badge) for badge in badges.values()) == 2585
+
+
+class TestRucksackBatch:
+
+    @pytest.fixture(autouse=True)
+    def requires_numpy(self):
+        pytest.importorskip('numpy')
+
+    def test_small_ex(self, small_ex_txt):
+        batch = RucksackBatch.from_file(small_ex_txt)
+        assert len(batch) == 6
+        assert batch.q1_priorities() == 157
+        assert batch.q2_badges() == 70
+
+    def test_input(self, input_txt):
+        batch = RucksackBatch.from_file(input_txt)
+        assert batch.q1_priorities() == 7917
+        assert batch.q2_badges() == 2585
+
+    @pytest.mark.parametrize('content', (
+        b'',
+        b'aa\n\n',
+        b'aAbBa\nA\n\nAa',
+        b'abca\nZZbb\nbxyb\nkbzz\n',
+    ))
+    @pytest.mark.parametrize('group_size', (1, 2, 3))
+    def test_same_as_rucksacks(self, tmp_path, content, group_size):
+        rucksacks_file = tmp_path / "ex1.txt"
+        rucksacks_file.write_bytes(content)
+
+        rucksacks = Rucksack.from_file(rucksacks_file)
+        batch = RucksackBatch.from_file(rucksacks_file)
+        assert batch.q1_priorities() == q1_priorities(rucksacks)
+        try:
+            expected = q2_badges(rucksacks, group_size)
+        except ValueError:
+            with pytest.raises(ValueError):
+                batch.q2_badges(group_size)
+        else:
+            assert batch.q2_badges(group_size) == expected
+
 
 class TestQuestion1:
 
@@ -93,6 +221,9 @@ class TestQuestion1:
     def test_input(self, input_rucksacks):
         assert q1_priorities(input_rucksacks) == 7917
 
+    def test_input_mask(self, input_txt):
+        assert q1_priorities(Rucksack.from_file(input_txt, MaskCompartment)) == 7917
+
 
 class TestQuestion2:
 
@@ -101,3 +232,6 @@ class TestQuestion2:
 
     def test_input(self, input_rucksacks):
         assert q2_badges(input_rucksacks) == 2585
+
+    def test_input_mask(self, input_txt):
+        assert q2_badges(Rucksack.from_file(input_txt, MaskCompartment)) == 2585
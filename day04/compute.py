@@ -1,11 +1,26 @@
+import bisect
 import dataclasses
+import heapq
+import random
+import re
+import time
 from argparse import ArgumentParser
+from array import array
 from typing import (
+    ClassVar,
+    Iterable,
+    Iterator,
     List,
     Self,
     Tuple,
+    Union,
 )
 
+try:
+    import numpy as np
+except ImportError:  # RangeColumns falls back on array
+    np = None
+
 
 @dataclasses.dataclass(frozen=True)
 class Range:
@@ -43,6 +58,250 @@ class Range:
         return data
 
 
+@dataclasses.dataclass
+class RangeColumns:
+    """The pairs of `Range.from_file` as 4 integer columns, numpy arrays if available."""
+    a_start: Union[array, 'np.ndarray']
+    a_end: Union[array, 'np.ndarray']
+    b_start: Union[array, 'np.ndarray']
+    b_end: Union[array, 'np.ndarray']
+
+    pair_re: ClassVar = re.compile(r'(\d+)-(\d+),(\d+)-(\d+)')
+
+    def __len__(self) -> int:
+        return len(self.a_start)
+
+    @classmethod
+    def from_str(cls, content: str, use_numpy: bool = True) -> Self:
+        """Parse each line straight into the columns, raising like `Range.from_file` on a line that is not a pair."""
+        columns = tuple(array('q') for _ in range(4))
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            pair = cls.pair_re.fullmatch(line)
+            if pair is None:
+                raise ValueError(f'Expected a pair of ranges on line {line_number}: {line}')
+            for column, value in zip(columns, pair.groups()):
+                column.append(int(value))
+        if use_numpy and np is not None:
+            # views on the arrays, nothing is copied
+            return cls(*(np.frombuffer(column, dtype=np.int64) for column in columns))
+        return cls(*columns)
+
+    @classmethod
+    def from_file(cls, filename: str, use_numpy: bool = True) -> Self:
+        print(f'Loading from {filename} as columns')
+        with open(filename, 'r') as f:
+            return cls.from_str(f.read(), use_numpy=use_numpy)
+
+    @property
+    def is_numpy(self) -> bool:
+        return np is not None and isinstance(self.a_start, np.ndarray)
+
+    def q1_contains_each_other(self) -> int:
+        if self.is_numpy:
+            a_contains_b = (self.a_start <= self.b_start) & (self.b_end <= self.a_end)
+            b_contains_a = (self.b_start <= self.a_start) & (self.a_end <= self.b_end)
+            return int(np.count_nonzero(a_contains_b | b_contains_a))
+        result = 0
+        for a_start, a_end, b_start, b_end in zip(self.a_start, self.a_end, self.b_start, self.b_end):
+            if (a_start <= b_start and b_end <= a_end) or (b_start <= a_start and a_end <= b_end):
+                result += 1
+        return result
+
+    def q2_overlaps(self) -> int:
+        if self.is_numpy:
+            return int(np.count_nonzero((self.a_start <= self.b_end) & (self.b_start <= self.a_end)))
+        result = 0
+        for a_start, a_end, b_start, b_end in zip(self.a_start, self.a_end, self.b_start, self.b_end):
+            if a_start <= b_end and b_start <= a_end:
+                result += 1
+        return result
+
+
+@dataclasses.dataclass
+class RangeIndex:
+    """Dataset wide queries on all the assignments, the id of an assignment is its position in `ranges`."""
+    ranges: List[Range]
+
+    @classmethod
+    def from_pairs(cls, data: List[Tuple[Range, Range]]) -> Self:
+        return cls([r for pair in data for r in pair])
+
+    def _by_start(self) -> List[int]:
+        return sorted(range(len(self.ranges)), key=lambda i: (self.ranges[i].start, -self.ranges[i].end))
+
+    def overlapping_pairs(self) -> Iterator[Tuple[int, int]]:
+        """Sweep by start, yielding every pair of overlapping assignments (lowest id first) once."""
+        active = set()
+        # (end, id) of the active assignments to drop them once the sweep is past their end
+        ends: List[Tuple[int, int]] = []
+        for i in self._by_start():
+            current = self.ranges[i]
+            while ends and ends[0][0] < current.start:
+                active.discard(heapq.heappop(ends)[1])
+            for j in active:
+                yield min(i, j), max(i, j)
+            active.add(i)
+            heapq.heappush(ends, (current.end, i))
+
+    def count_overlapping_pairs(self) -> int:
+        """Same as counting `overlapping_pairs` without listing them."""
+        starts = sorted(r.start for r in self.ranges)
+        ends = sorted(r.end for r in self.ranges)
+        total = 0
+        # each assignment overlaps the ones starting before it (ties broken by position) that have not ended yet
+        for position, start in enumerate(starts):
+            total += position - bisect.bisect_left(ends, start)
+        return total
+
+    def max_coverage(self) -> Tuple[int, int]:
+        """Maximum number of assignments on a single section, and the first section where it is reached."""
+        events = []
+        for r in self.ranges:
+            events.append((r.start, 1))
+            events.append((r.end + 1, -1))
+        # on a tie the ends (-1) are applied before the starts
+        events.sort()
+        best, best_section, current = 0, 0, 0
+        for section, change in events:
+            current += change
+            if current > best:
+                best, best_section = current, section
+        return best, best_section
+
+    def longest_containment_chain(self) -> List[int]:
+        """Longest list of assignments where each one is contained in the previous one."""
+        by_start = self._by_start()
+        # longest non-increasing subsequence of ends, with ids of the best tail for each length
+        tails: List[int] = []
+        tail_ids: List[int] = []
+        previous = {}
+        for i in by_start:
+            key = -self.ranges[i].end
+            length = bisect.bisect_right(tails, key)
+            if length == len(tails):
+                tails.append(key)
+                tail_ids.append(i)
+            else:
+                tails[length] = key
+                tail_ids[length] = i
+            previous[i] = tail_ids[length - 1] if length else None
+
+        chain = []
+        current = tail_ids[-1] if tail_ids else None
+        while current is not None:
+            chain.append(current)
+            current = previous[current]
+        return list(reversed(chain))
+
+
+@dataclasses.dataclass
+class SectionCoverage:
+    """Number of assignments covering each section, stored per segment of sections with the same coverage.
+
+    Segment `i` is sections `boundaries[i]` to `boundaries[i + 1] - 1` covered `counts[i]` times, sections after the
+    last boundary (or before the first one) are not covered.
+    """
+    boundaries: List[int]
+    counts: List[int]
+    # prefix_totals[i] is the sum of coverage of all the sections before boundaries[i]
+    prefix_totals: List[int]
+    # sparse_max[k][i] is the max of counts[i:i + 2 ** k]
+    sparse_max: List[List[int]]
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Range]) -> Self:
+        # difference array on compressed coordinates
+        changes = {}
+        for r in ranges:
+            changes[r.start] = changes.get(r.start, 0) + 1
+            changes[r.end + 1] = changes.get(r.end + 1, 0) - 1
+        # a boundary where as many ranges end as start does not change the coverage, keep one segment across it
+        boundaries = sorted(section for section, change in changes.items() if change)
+        counts = []
+        prefix_totals = [0]
+        current = 0
+        for i, section in enumerate(boundaries):
+            current += changes[section]
+            counts.append(current)
+            if i + 1 < len(boundaries):
+                prefix_totals.append(prefix_totals[-1] + current * (boundaries[i + 1] - section))
+
+        sparse_max = [counts]
+        width = 1
+        while width * 2 <= len(counts):
+            previous = sparse_max[-1]
+            sparse_max.append([max(previous[i], previous[i + width]) for i in range(len(counts) - width * 2 + 1)])
+            width *= 2
+        return cls(boundaries, counts, prefix_totals, sparse_max)
+
+    @classmethod
+    def from_pairs(cls, data: List[Tuple[Range, Range]]) -> Self:
+        return cls.from_ranges(r for pair in data for r in pair)
+
+    def _segment(self, section: int) -> int:
+        """Index of the segment containing `section`, -1 before the first one."""
+        return bisect.bisect_right(self.boundaries, section) - 1
+
+    def coverage_at(self, section: int) -> int:
+        segment = self._segment(section)
+        if segment < 0:
+            return 0
+        return self.counts[segment]
+
+    def _total_before(self, section: int) -> int:
+        """Sum of the coverage of the sections strictly before `section`."""
+        segment = self._segment(section - 1)
+        if segment < 0:
+            return 0
+        return self.prefix_totals[segment] + self.counts[segment] * (section - self.boundaries[segment])
+
+    def total_coverage(self, start: int, end: int) -> int:
+        """Number of (assignment, section) for the sections `start` to `end`."""
+        return self._total_before(end + 1) - self._total_before(start)
+
+    def max_coverage(self, start: int, end: int) -> int:
+        """Highest coverage of a section between `start` and `end`."""
+        first = max(self._segment(start), 0)
+        last = self._segment(end)
+        if last < first:
+            return 0
+        level = (last - first + 1).bit_length() - 1
+        return max(self.sparse_max[level][first], self.sparse_max[level][last - (1 << level) + 1])
+
+    def segments(self) -> Iterator[Tuple[Range, int]]:
+        for i in range(len(self.boundaries) - 1):
+            yield Range(self.boundaries[i], self.boundaries[i + 1] - 1), self.counts[i]
+
+    def uncovered(self) -> List[Range]:
+        """Sections nobody covers between the first and last covered sections."""
+        return [r for r, count in self.segments() if count == 0]
+
+    def most_contended(self, top: int = 3) -> List[Tuple[Range, int]]:
+        return heapq.nlargest(top, self.segments(), key=lambda segment: segment[1])
+
+
+def random_ranges(count: int, max_section: int = 10 ** 6, max_width: int = 100, seed: int = 0) -> List[Range]:
+    generator = random.Random(seed)
+    ranges = []
+    for _ in range(count):
+        start = generator.randint(1, max_section)
+        ranges.append(Range(start, start + generator.randint(0, max_width)))
+    return ranges
+
+
+def benchmark(count: int = 10 ** 6):
+    index = RangeIndex(random_ranges(count))
+    for label, query in (
+        ('count_overlapping_pairs', index.count_overlapping_pairs),
+        ('overlapping_pairs', lambda: sum(1 for _ in index.overlapping_pairs())),
+        ('max_coverage', index.max_coverage),
+        ('longest_containment_chain', lambda: len(index.longest_containment_chain())),
+    ):
+        start = time.perf_counter()
+        result = query()
+        print(f'{label} on {count} assignments: {result} in {time.perf_counter() - start:.2f}s')
+
+
 def q1_contains_each_other(data: List[Tuple[Range, Range]]) -> int:
     result = 0
     for a, b in data:
@@ -62,12 +321,39 @@ def q2_overlaps(data: List[Tuple[Range, Range]]) -> int:
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--columns', action='store_true', default=False, help='Use the columnar loader')
+    parser.add_argument('--all-pairs', action='store_true', default=False, help='Dataset wide queries')
+    parser.add_argument('--coverage', action='store_true', default=False, help='Per section statistics')
+    parser.add_argument('--benchmark', type=int, default=0, help='Benchmark the dataset wide queries')
     args = parser.parse_args()
 
-    entries = Range.from_file(args.input)
-    print(f'Loaded {len(entries)} pairs')
-    contained = q1_contains_each_other(entries)
-    print(f'Q1: {contained} pairs contain the other')
+    if args.benchmark:
+        benchmark(args.benchmark)
+
+    if args.columns:
+        columns = RangeColumns.from_file(args.input)
+        print(f'Loaded {len(columns)} pairs')
+        contained = columns.q1_contains_each_other()
+        overlaps = columns.q2_overlaps()
+    else:
+        entries = Range.from_file(args.input)
+        print(f'Loaded {len(entries)} pairs')
+        contained = q1_contains_each_other(entries)
+        overlaps = q2_overlaps(entries)
 
-    overlaps = q2_overlaps(entries)
+    print(f'Q1: {contained} pairs contain the other')
     print(f'Q2: {overlaps} pairs overlap with the other')
+
+    if args.all_pairs:
+        index = RangeIndex.from_pairs(Range.from_file(args.input))
+        print(f'{index.count_overlapping_pairs()} pairs of assignments overlap')
+        coverage, section = index.max_coverage()
+        print(f'Up to {coverage} elves are assigned to section {section}')
+        chain = [index.ranges[i] for i in index.longest_containment_chain()]
+        print(f'Longest containment chain: {len(chain)} assignments from {chain[0]} to {chain[-1]}')
+
+    if args.coverage:
+        coverage = SectionCoverage.from_pairs(Range.from_file(args.input))
+        print(f'Uncovered sections: {", ".join(f"{r.start}-{r.end}" for r in coverage.uncovered()) or "none"}')
+        for r, count in coverage.most_contended():
+            print(f'Sections {r.start}-{r.end} are assigned to {count} elves')
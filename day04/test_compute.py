@@ -4,8 +4,12 @@ import pytest
 
 from .compute import (
     Range,
+    RangeColumns,
+    RangeIndex,
+    SectionCoverage,
     q1_contains_each_other,
     q2_overlaps,
+    random_ranges,
 )
 
 
@@ -25,6 +29,11 @@ def input_txt():
     )
 
 
+@pytest.fixture(scope='session')
+def small_ex_index(small_ex_txt):
+    return RangeIndex.from_pairs(Range.from_file(small_ex_txt))
+
+
 class TestRange:
 
     @pytest.mark.parametrize('start, end', (
@@ -71,6 +80,146 @@ class TestRange:
         ]
 
 
+class TestRangeColumns:
+
+    @pytest.fixture(params=(False, True), ids=('array', 'numpy'))
+    def use_numpy(self, request):
+        if request.param:
+            pytest.importorskip('numpy')
+        return request.param
+
+    def test_from_file(self, small_ex_txt, use_numpy):
+        columns = RangeColumns.from_file(small_ex_txt, use_numpy=use_numpy)
+        assert columns.is_numpy is use_numpy
+        assert list(zip(columns.a_start, columns.a_end, columns.b_start, columns.b_end)) == [
+            (a.start, a.end, b.start, b.end)
+            for a, b in Range.from_file(small_ex_txt)
+        ]
+
+    @pytest.mark.parametrize('content', (
+        '1-2,3\n',
+        # same number count as 2 valid lines
+        '1-2,3\n4-5,6-7-8\n',
+        '1-2-3,4\n',
+        '1,2,3,4\n',
+        '1-2,3-4\n\n5-6,7-8\n',
+    ))
+    def test_from_str_invalid(self, tmp_path, content, use_numpy):
+        with pytest.raises(ValueError):
+            RangeColumns.from_str(content, use_numpy=use_numpy)
+        invalid_file = tmp_path / "ex1.txt"
+        invalid_file.write_text(content)
+        with pytest.raises(ValueError):
+            Range.from_file(invalid_file)
+
+    @pytest.mark.parametrize('filename, q1, q2', (
+        ('small_ex_txt', 2, 4),
+        ('input_txt', 448, 794),
+    ))
+    def test_questions(self, request, use_numpy, filename, q1, q2):
+        columns = RangeColumns.from_file(request.getfixturevalue(filename), use_numpy=use_numpy)
+        assert columns.q1_contains_each_other() == q1
+        assert columns.q2_overlaps() == q2
+
+    def test_same_as_objects(self, use_numpy):
+        ranges = random_ranges(2000, max_section=100, max_width=20)
+        pairs = list(zip(ranges[0::2], ranges[1::2]))
+        content = '\n'.join(f'{a.start}-{a.end},{b.start}-{b.end}' for a, b in pairs)
+        columns = RangeColumns.from_str(content, use_numpy=use_numpy)
+        assert columns.q1_contains_each_other() == q1_contains_each_other(pairs)
+        assert columns.q2_overlaps() == q2_overlaps(pairs)
+
+
+class TestRangeIndex:
+
+    @staticmethod
+    def naive_pairs(index):
+        return {
+            (i, j)
+            for i, a in enumerate(index.ranges)
+            for j, b in enumerate(index.ranges[i + 1:], start=i + 1)
+            if a.overlaps_with(b)
+        }
+
+    def test_overlapping_pairs(self, small_ex_index):
+        pairs = list(small_ex_index.overlapping_pairs())
+        assert len(pairs) == len(set(pairs))
+        assert set(pairs) == self.naive_pairs(small_ex_index)
+        assert small_ex_index.count_overlapping_pairs() == len(pairs)
+
+    def test_input(self, input_txt):
+        index = RangeIndex.from_pairs(Range.from_file(input_txt))
+        expected = self.naive_pairs(index)
+        assert set(index.overlapping_pairs()) == expected
+        assert index.count_overlapping_pairs() == len(expected)
+
+    def test_max_coverage(self, small_ex_index):
+        # 6 is in 6-8, 5-7, 2-8, 3-7, 6-6, 4-6, 2-6 and 4-8
+        assert small_ex_index.max_coverage() == (8, 6)
+        assert RangeIndex([]).max_coverage() == (0, 0)
+        assert RangeIndex([Range(1, 2), Range(3, 4)]).max_coverage() == (1, 1)
+
+    def test_longest_containment_chain(self, small_ex_index):
+        chain = [small_ex_index.ranges[i] for i in small_ex_index.longest_containment_chain()]
+        # e.g. 2-8 > 2-6 > 2-4 > 2-3
+        assert len(chain) == 4
+        for outer, inner in zip(chain, chain[1:]):
+            assert inner in outer
+        assert RangeIndex([]).longest_containment_chain() == []
+        assert RangeIndex([Range(1, 2), Range(1, 2)]).longest_containment_chain() == [0, 1]
+
+
+class TestSectionCoverage:
+
+    @staticmethod
+    def naive_coverage(ranges, section):
+        return sum(r.start <= section <= r.end for r in ranges)
+
+    def test_coverage_at(self, small_ex_index):
+        coverage = SectionCoverage.from_ranges(small_ex_index.ranges)
+        assert coverage.coverage_at(6) == 8
+        for section in range(0, 11):
+            assert coverage.coverage_at(section) == self.naive_coverage(small_ex_index.ranges, section)
+
+    def test_random(self):
+        # sparse and large sections
+        ranges = random_ranges(300, max_section=10 ** 9, max_width=10 ** 7) + [Range(5, 5), Range(5, 10)]
+        coverage = SectionCoverage.from_ranges(ranges)
+        for section in [0, 4, 5, 10, 11] + [b + delta for b in coverage.boundaries[::10] for delta in (-1, 0, 1)]:
+            assert coverage.coverage_at(section) == self.naive_coverage(ranges, section), f'section {section}'
+
+    def test_range_queries(self):
+        ranges = [Range(2, 4), Range(3, 8), Range(9, 12), Range(20, 30)]
+        coverage = SectionCoverage.from_ranges(ranges)
+        for start in range(0, 35):
+            for end in range(start, 35):
+                sections = [self.naive_coverage(ranges, s) for s in range(start, end + 1)]
+                assert coverage.total_coverage(start, end) == sum(sections)
+                assert coverage.max_coverage(start, end) == max(sections)
+
+    def test_uncovered(self, small_ex_txt):
+        assert SectionCoverage.from_pairs(Range.from_file(small_ex_txt)).uncovered() == []
+        coverage = SectionCoverage.from_ranges([Range(2, 4), Range(3, 8), Range(20, 30), Range(31, 31)])
+        assert coverage.uncovered() == [Range(9, 19)]
+
+    def test_most_contended(self):
+        coverage = SectionCoverage.from_ranges([Range(2, 4), Range(3, 8), Range(20, 30), Range(25, 40)])
+        assert coverage.most_contended(2) == [(Range(3, 4), 2), (Range(25, 30), 2)]
+
+    def test_adjacent_ranges(self):
+        coverage = SectionCoverage.from_ranges([Range(1, 4), Range(5, 8)])
+        assert coverage.most_contended(1) == [(Range(1, 8), 1)]
+        coverage = SectionCoverage.from_ranges([Range(1, 4), Range(5, 8), Range(1, 8), Range(20, 20)])
+        assert list(coverage.segments()) == [(Range(1, 8), 2), (Range(9, 19), 0), (Range(20, 20), 1)]
+
+    def test_empty(self):
+        coverage = SectionCoverage.from_ranges([])
+        assert coverage.coverage_at(1) == 0
+        assert coverage.total_coverage(1, 10) == 0
+        assert coverage.max_coverage(1, 10) == 0
+        assert coverage.uncovered() == []
+
+
 class TestQuestion1:
 
     def test_small_ex(self, small_ex_txt):
@@ -1,19 +1,28 @@
 import dataclasses
+import random
 import re
+import sys
+import time
 from argparse import ArgumentParser
 from copy import deepcopy
+from string import ascii_uppercase
 from typing import (
     ClassVar,
     Dict,
+    Iterable,
+    Iterator,
     List,
     Optional,
     Self,
+    Tuple,
+    Type,
+    Union,
 )
 
 
 @dataclasses.dataclass
 class Action:
-    action_re: ClassVar = re.compile(r'move (\d+) from (\d) to (\d)')
+    action_re: ClassVar = re.compile(r'move (\d+) from (\d+) to (\d+)')
 
     amount: int
     move_from: int
@@ -27,6 +36,14 @@ class Action:
         action = cls.action_re.match(content).groups()
         return cls(amount=int(action[0]), move_from=int(action[1]), move_to=int(action[2]))
 
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> Iterator[Self]:
+        """Lazily parse the actions, skipping empty lines."""
+        for line in lines:
+            content = line.replace('\n', '')
+            if content:
+                yield cls.from_str(content)
+
 
 @dataclasses.dataclass
 class Stack:
@@ -65,6 +82,42 @@ class Stack:
 
         return True
 
+    @classmethod
+    def stacks_from_drawing(cls, drawing: List[str], numbers: str = '') -> Dict[int, Self]:
+        """Build the stacks bottom-up from the lines of the drawing, top line first.
+
+        Stack `i` is the crate at column `4 * (i - 1) + 1`, any number of stacks is supported. Every stack listed in
+        the `numbers` line exists even when it starts without crates.
+        """
+        stacks: Dict[int, Self] = {int(i): cls() for i in numbers.split()}
+        for line in reversed(drawing):
+            for column in range(1, len(line), 4):
+                crate = line[column]
+                if crate != ' ' and line[column - 1] == '[':
+                    i = column // 4 + 1
+                    if i not in stacks:
+                        stacks[i] = cls()
+                    stacks[i].crates.append(crate)
+        return stacks
+
+    @classmethod
+    def read_drawing(cls, lines: Iterator[str]) -> Dict[int, Self]:
+        """Consume the lines of the drawing, and its stack numbers, from `lines`."""
+        drawing = []
+        numbers = ''
+        for line in lines:
+            content = line.replace('\n', '')
+            if '[' not in content:
+                # stack numbers: the actions are next
+                numbers = content
+                break
+            drawing.append(content)
+        return cls.stacks_from_drawing(drawing, numbers)
+
+    @classmethod
+    def from_crates(cls, crates: List[str]) -> Self:
+        return cls(list(crates))
+
     def add(self, crate: str):
         self.crates.append(crate)
 
@@ -76,26 +129,195 @@ class Stack:
     def take(self) -> str:
         return self.crates.pop(-1)
 
+    def take_many(self, amount: int) -> List[str]:
+        """Take the `amount` top crates at once, in the stack order."""
+        if amount > len(self.crates):
+            raise IndexError(f'Cannot take {amount} crates from {len(self.crates)}')
+        if not amount:
+            return []
+        crates = self.crates[-amount:]
+        del self.crates[-amount:]
+        return crates
+
+    def add_many(self, crates: List[str]):
+        self.crates.extend(crates)
+
+
+class _TreapNode:
+    __slots__ = ('crate', 'priority', 'size', 'left', 'right', 'reversed')
+
+    def __init__(self, crate: str):
+        self.crate = crate
+        self.priority = random.random()
+        self.size = 1
+        self.left: Optional[_TreapNode] = None
+        self.right: Optional[_TreapNode] = None
+        # the children are to be swapped, lazily pushed down
+        self.reversed = False
+
+
+def _size(node: Optional[_TreapNode]) -> int:
+    return node.size if node is not None else 0
+
+
+def _push(node: _TreapNode):
+    if node.reversed:
+        node.left, node.right = node.right, node.left
+        for child in (node.left, node.right):
+            if child is not None:
+                child.reversed = not child.reversed
+        node.reversed = False
+
+
+def _update(node: _TreapNode):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node: Optional[_TreapNode], count: int) -> Tuple[Optional[_TreapNode], Optional[_TreapNode]]:
+    """Split in the first `count` crates and the others."""
+    if node is None:
+        return None, None
+    _push(node)
+    if _size(node.left) >= count:
+        first, node.left = _split(node.left, count)
+        _update(node)
+        return first, node
+    node.right, second = _split(node.right, count - _size(node.left) - 1)
+    _update(node)
+    return node, second
+
+
+def _join(first: Optional[_TreapNode], second: Optional[_TreapNode]) -> Optional[_TreapNode]:
+    if first is None:
+        return second
+    if second is None:
+        return first
+    if first.priority > second.priority:
+        _push(first)
+        first.right = _join(first.right, second)
+        _update(first)
+        return first
+    _push(second)
+    second.left = _join(first, second.left)
+    _update(second)
+    return second
+
+
+class TreapStack:
+    """Stack backed by an implicit treap: taking, adding and reversing many crates is O(log n)."""
+
+    def __init__(self, root: _TreapNode = None):
+        self.root = root
+
+    @classmethod
+    def from_crates(cls, crates: List[str]) -> Self:
+        """Build the treap in O(n), keeping the nodes of the right spine of the tree."""
+        spine: List[_TreapNode] = []
+        for crate in crates:
+            node = _TreapNode(crate)
+            last = None
+            while spine and spine[-1].priority < node.priority:
+                last = spine.pop()
+                _update(last)
+            node.left = last
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+        while len(spine) > 1:
+            _update(spine.pop())
+        if spine:
+            _update(spine[0])
+            return cls(spine[0])
+        return cls()
+
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def __iter__(self) -> Iterator[str]:
+        # in-order traversal without recursion, applying the pending reverses
+        pending = []
+        node = self.root
+        while pending or node is not None:
+            while node is not None:
+                _push(node)
+                pending.append(node)
+                node = node.left
+            node = pending.pop()
+            yield node.crate
+            node = node.right
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (TreapStack, Stack)):
+            return self.crates == other.crates
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.crates!r})'
+
+    @property
+    def crates(self) -> List[str]:
+        return list(self)
+
+    def add(self, crate: str):
+        self.root = _join(self.root, _TreapNode(crate))
+
+    def top(self) -> Optional[str]:
+        node = self.root
+        if node is None:
+            return None
+        _push(node)
+        while node.right is not None:
+            node = node.right
+            _push(node)
+        return node.crate
+
+    def take(self) -> str:
+        return self.take_many(1).top()
+
+    def take_many(self, amount: int) -> Self:
+        """Take the `amount` top crates at once, in the stack order."""
+        if amount > len(self):
+            raise IndexError(f'Cannot take {amount} crates from {len(self)}')
+        self.root, taken = _split(self.root, len(self) - amount)
+        return type(self)(taken)
+
+    def add_many(self, crates: Union[Self, List[str]]):
+        if not isinstance(crates, TreapStack):
+            crates = TreapStack.from_crates(crates)
+        self.root = _join(self.root, crates.root)
+
+    def reverse(self):
+        if self.root is not None:
+            self.root.reversed = not self.root.reversed
+
+
+AnyStack = Union[Stack, TreapStack]
+
 
 @dataclasses.dataclass
 class Cargo:
-    stacks: Dict[int, Stack]
+    stacks: Dict[int, AnyStack]
     actions: List[Action]
 
     @classmethod
     def from_file(cls, filename: str) -> Self:
-        obj = cls(stacks={}, actions=[])
-        loading_stacks = True
         print(f'Loading {filename}')
         with open(filename, 'r') as f:
-            for line in f:
-                content = line.replace('\n', '')
+            stacks = Stack.read_drawing(f)
+            return cls(stacks=stacks, actions=list(Action.from_lines(f)))
 
-                if loading_stacks:
-                    loading_stacks = Stack.load_stacks(content, obj.stacks)
-                elif content:
-                    obj.actions.append(Action.from_str(content))
-        return obj
+    @classmethod
+    def replay_file(cls, filename: str, stack_cls: Type[AnyStack] = None) -> Tuple[Self, Self]:
+        """Same as `from_file(filename).transform_both()` with the actions streamed from the file."""
+        print(f'Replaying {filename}')
+        with open(filename, 'r') as f:
+            cargo = cls(stacks=Stack.read_drawing(f), actions=[])
+            one_by_one = cargo.copy(stack_cls)
+            simultaneous = cargo.copy(stack_cls)
+            for action in Action.from_lines(f):
+                one_by_one.move_many(action)
+                simultaneous.move_many(action, simultaneous=True)
+        return one_by_one, simultaneous
 
     def move(self, what: Action, simultaneous=False):
         from_stack = self.stacks[what.move_from]
@@ -109,6 +331,41 @@ class Cargo:
             for _ in range(what.amount):
                 to_stack.add(from_stack.take())
 
+    def move_many(self, what: Action, simultaneous=False):
+        """Same as `move` with slices of crates instead of one crate at a time."""
+        if what.move_from == what.move_to:
+            # each crate is put back where it was taken so the stack is unchanged, too many crates still fail
+            stack = self.stacks[what.move_from]
+            stack.add_many(stack.take_many(what.amount))
+            return
+        crates = self.stacks[what.move_from].take_many(what.amount)
+        if not simultaneous:
+            # moving crates one by one reverses them
+            crates.reverse()
+        self.stacks[what.move_to].add_many(crates)
+
+    def copy(self, stack_cls: Type[AnyStack] = None) -> Self:
+        """Copy of the stacks, without the actions: crates are strings so no deep copy is needed.
+
+        :param stack_cls: to change the backend of the stacks, by default the backend of each stack is kept.
+        """
+        return type(self)(
+            stacks={
+                k: (stack_cls or type(stack)).from_crates(stack.crates)
+                for k, stack in self.stacks.items()
+            },
+            actions=[],
+        )
+
+    def transform_both(self, stack_cls: Type[AnyStack] = None) -> Tuple[Self, Self]:
+        """Same as `transform` with and without `simultaneous`, replaying the actions once."""
+        one_by_one = self.copy(stack_cls)
+        simultaneous = self.copy(stack_cls)
+        for action in self.actions:
+            one_by_one.move_many(action)
+            simultaneous.move_many(action, simultaneous=True)
+        return one_by_one, simultaneous
+
     def transform(self, simultaneous=False) -> Self:
         new_cargo = deepcopy(self)
         new_cargo.actions = []
@@ -116,6 +373,47 @@ class Cargo:
             new_cargo.move(action, simultaneous=simultaneous)
         return new_cargo
 
+    def trace_top_output(self, simultaneous=False) -> str:
+        """Same as `transform(simultaneous).top_output()` without moving crates.
+
+        Only the stack sizes are replayed, then the position of each final top crate is traced back through the
+        actions to the crate it was in the original stacks.
+        """
+        sizes = {k: len(stack.crates) for k, stack in self.stacks.items()}
+        for action in self.actions:
+            if sizes[action.move_from] < action.amount:
+                raise IndexError(f'Cannot take {action.amount} crates from {sizes[action.move_from]}')
+            sizes[action.move_from] -= action.amount
+            sizes[action.move_to] += action.amount
+
+        # final top position -> (stack, position) it is at before the current action
+        tracked = {
+            k: (k, size - 1)
+            for k, size in sizes.items()
+            if size
+        }
+        for action in reversed(self.actions):
+            if action.move_from == action.move_to:
+                # taking crates and putting them back leaves the stack unchanged
+                continue
+            to_before = sizes[action.move_to] - action.amount
+            from_before = sizes[action.move_from] + action.amount
+            for k, (stack, position) in tracked.items():
+                if stack == action.move_to and position >= to_before:
+                    # offset from the bottom of the moved crates
+                    offset = position - to_before
+                    if simultaneous:
+                        tracked[k] = (action.move_from, from_before - action.amount + offset)
+                    else:
+                        tracked[k] = (action.move_from, from_before - 1 - offset)
+            sizes[action.move_to] = to_before
+            sizes[action.move_from] = from_before
+
+        return ''.join(
+            self.stacks[stack].crates[position]
+            for _, (stack, position) in sorted(tracked.items())
+        )
+
     def top_output(self):
         return ''.join(
             self.stacks[k].top() or ''
@@ -123,15 +421,152 @@ class Cargo:
         )
 
 
+# crates of each stack as a string, bottom first
+Snapshot = Dict[int, str]
+
+
+@dataclasses.dataclass
+class CargoReplay:
+    """Replay of the actions of a cargo with a snapshot of the stacks every `interval` actions."""
+    cargo: Cargo
+    simultaneous: bool = False
+    interval: int = 100
+    # checkpoints[i] is the state after i * interval actions
+    checkpoints: List[Snapshot] = dataclasses.field(default_factory=list)
+
+    def __post_init__(self):
+        if self.interval < 1:
+            raise ValueError(f'Invalid interval {self.interval}')
+        if not self.checkpoints:
+            self._record()
+
+    @staticmethod
+    def snapshot(cargo: Cargo) -> Snapshot:
+        return {k: ''.join(stack.crates) for k, stack in cargo.stacks.items()}
+
+    def _record(self):
+        current = self.cargo.copy(Stack)
+        self.checkpoints.append(self.snapshot(current))
+        for i, action in enumerate(self.cargo.actions, start=1):
+            current.move_many(action, self.simultaneous)
+            if i % self.interval == 0:
+                self.checkpoints.append(self.snapshot(current))
+
+    def state_at(self, index: int) -> Cargo:
+        """State of the cargo after the first `index` actions."""
+        if not 0 <= index <= len(self.cargo.actions):
+            raise IndexError(f'No state after {index} actions')
+        checkpoint = index // self.interval
+        state = Cargo(
+            stacks={k: Stack(list(crates)) for k, crates in self.checkpoints[checkpoint].items()},
+            actions=[],
+        )
+        for action in self.cargo.actions[checkpoint * self.interval:index]:
+            state.move_many(action, self.simultaneous)
+        return state
+
+    def memory_usage(self) -> int:
+        """Approximate size in bytes of the checkpoints."""
+        return sum(
+            sys.getsizeof(snapshot) + sum(sys.getsizeof(crates) for crates in snapshot.values())
+            for snapshot in self.checkpoints
+        )
+
+
+def benchmark_checkpoints(cargo: Cargo, intervals: Iterable[int], queries: int = 100):
+    generator = random.Random(0)
+    indexes = [generator.randint(0, len(cargo.actions)) for _ in range(queries)]
+    for interval in intervals:
+        start = time.perf_counter()
+        replay = CargoReplay(cargo, interval=interval)
+        recorded = time.perf_counter()
+        for index in indexes:
+            replay.state_at(index)
+        latency = (time.perf_counter() - recorded) / queries
+        print(
+            f'interval {interval}: {len(replay.checkpoints)} checkpoints, {replay.memory_usage() / 1024.0:.1f}kiB, '
+            f'recorded in {recorded - start:.3f}s, {latency * 1000.0:.3f}ms per state_at',
+        )
+
+
+def random_cargo(stacks: int, crates: int, actions: int, max_amount: int, seed: int = 0) -> Cargo:
+    generator = random.Random(seed)
+    cargo = Cargo(
+        stacks={
+            i: Stack([generator.choice(ascii_uppercase) for _ in range(crates)])
+            for i in range(1, stacks + 1)
+        },
+        actions=[],
+    )
+    sizes = {i: crates for i in cargo.stacks}
+    for _ in range(actions):
+        move_from, move_to = generator.sample(sorted(sizes), 2)
+        amount = generator.randint(0, min(max_amount, sizes[move_from]))
+        sizes[move_from] -= amount
+        sizes[move_to] += amount
+        cargo.actions.append(Action(amount, move_from, move_to))
+    return cargo
+
+
+def benchmark(stacks: int = 9, crates: int = 5000, actions: int = 1000, max_amount: int = 5000):
+    cargo = random_cargo(stacks, crates, actions, max_amount)
+    print(f'Replaying {actions} actions on {stacks} stacks of {crates} crates moving up to {max_amount} crates')
+
+    start = time.perf_counter()
+    cargo.transform()
+    cargo.transform(simultaneous=True)
+    print(f'transform x2: {time.perf_counter() - start:.3f}s')
+
+    start = time.perf_counter()
+    cargo.trace_top_output()
+    cargo.trace_top_output(simultaneous=True)
+    print(f'trace_top_output x2: {time.perf_counter() - start:.3f}s')
+
+    benchmark_checkpoints(cargo, (10, 100, 1000))
+
+    for stack_cls in (Stack, TreapStack):
+        start = time.perf_counter()
+        one_by_one, simultaneous = cargo.copy(stack_cls), cargo.copy(stack_cls)
+        copied = time.perf_counter()
+        for action in cargo.actions:
+            one_by_one.move_many(action)
+            simultaneous.move_many(action, simultaneous=True)
+        print(
+            f'transform_both with {stack_cls.__name__}: {time.perf_counter() - start:.3f}s '
+            f'(copy {copied - start:.3f}s, moves {time.perf_counter() - copied:.3f}s)'
+        )
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--treap', action='store_true', default=False, help='Use the treap stacks')
+    parser.add_argument('--trace', action='store_true', default=False, help='Trace the top crates back')
+    parser.add_argument('--stream', action='store_true', default=False, help='Stream the actions from the file')
+    parser.add_argument('--state-at', type=int, default=None, help='Show the q1 stacks after this many actions')
+    parser.add_argument('--checkpoint-interval', type=int, default=100, help='Actions between checkpoints')
+    parser.add_argument('--benchmark', action='store_true', default=False, help='Compare the replays')
+    parser.add_argument('--benchmark-crates', type=int, default=5000, help='Size of the stacks in the benchmark')
     args = parser.parse_args()
 
-    orig_cargo = Cargo.from_file(args.input)
+    if args.benchmark:
+        benchmark(crates=args.benchmark_crates, max_amount=args.benchmark_crates)
 
-    q1_cargo = orig_cargo.transform()
-    print(f'q1: top cargo is {q1_cargo.top_output()}')
-
-    q2_cargo = orig_cargo.transform(simultaneous=True)
-    print(f'q2: top cargo is {q2_cargo.top_output()}')
+    stack_cls = TreapStack if args.treap else None
+    if args.stream:
+        q1_cargo, q2_cargo = Cargo.replay_file(args.input, stack_cls)
+        print(f'q1: top cargo is {q1_cargo.top_output()}')
+        print(f'q2: top cargo is {q2_cargo.top_output()}')
+    else:
+        orig_cargo = Cargo.from_file(args.input)
+        if args.state_at is not None:
+            state = CargoReplay(orig_cargo, interval=args.checkpoint_interval).state_at(args.state_at)
+            for k, crates in CargoReplay.snapshot(state).items():
+                print(f'{k}: {crates}')
+        if args.trace:
+            print(f'q1: top cargo is {orig_cargo.trace_top_output()}')
+            print(f'q2: top cargo is {orig_cargo.trace_top_output(simultaneous=True)}')
+        else:
+            q1_cargo, q2_cargo = orig_cargo.transform_both(stack_cls)
+            print(f'q1: top cargo is {q1_cargo.top_output()}')
+            print(f'q2: top cargo is {q2_cargo.top_output()}')
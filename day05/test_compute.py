@@ -5,7 +5,10 @@ import pytest
 from .compute import (
     Action,
     Cargo,
+    CargoReplay,
     Stack,
+    TreapStack,
+    random_cargo,
 )
 
 
@@ -25,15 +28,37 @@ def input_txt():
     )
 
 
+def with_self_moves(cargo, every=50):
+    """Copy of `cargo` where the largest stack is moved to itself every `every` actions."""
+    sizes = {k: len(stack.crates) for k, stack in cargo.stacks.items()}
+    actions = []
+    for index, action in enumerate(cargo.actions):
+        if index % every == 0:
+            largest = max(sizes, key=sizes.get)
+            actions.append(Action(sizes[largest], largest, largest))
+        actions.append(action)
+        sizes[action.move_from] -= action.amount
+        sizes[action.move_to] += action.amount
+    return Cargo(stacks=cargo.stacks, actions=actions)
+
+
 class TestAction:
 
     @pytest.mark.parametrize('content', (
         'move 1 from 2 to 1',
-        'move 10 from 2 to 1'
+        'move 10 from 2 to 1',
+        'move 10 from 12 to 3456',
     ))
     def test_from_str(self, content):
         assert Action.from_str(content).output() == content
 
+    def test_from_lines(self):
+        lines = iter(('move 1 from 2 to 1\n', '\n', 'move 3 from 10 to 2'))
+        actions = Action.from_lines(lines)
+        assert next(actions) == Action(1, 2, 1)
+        assert next(lines) == '\n', 'lines are consumed lazily'
+        assert list(actions) == [Action(3, 10, 2)]
+
 
 class TestStack:
 
@@ -77,6 +102,82 @@ class TestStack:
             3: Stack(['P']),
         }, 'unchanged'
 
+    def test_stacks_from_drawing(self):
+        drawing = [
+            '    [D]',
+            '[N] [C]    ',
+            '[Z] [M] [P]',
+        ]
+        assert Stack.stacks_from_drawing(drawing) == {
+            1: Stack(['Z', 'N']),
+            2: Stack(['M', 'C', 'D']),
+            3: Stack(['P']),
+        }
+
+    def test_read_drawing_empty_stack(self, tmp_path):
+        drawing_file = tmp_path / "ex1.txt"
+        drawing_file.write_text('[A]     [C]\n 1   2   3 \n\nmove 1 from 1 to 2\n')
+
+        cargo = Cargo.from_file(drawing_file)
+        assert cargo.stacks == {1: Stack(['A']), 2: Stack([]), 3: Stack(['C'])}
+        q1_cargo, q2_cargo = cargo.transform_both()
+        assert q1_cargo.top_output() == 'AC'
+        assert cargo.trace_top_output() == 'AC'
+
+    def test_read_drawing_wide(self):
+        count = 1200
+        lines = iter((
+            ' '.join(f'[{chr(ord("A") + i % 26)}]' for i in range(count)) + '\n',
+            ' '.join(f'{i:^3}' for i in range(1, count + 1)) + '\n',
+            '\n',
+            f'move 1 from {count} to 1\n',
+        ))
+        stacks = Stack.read_drawing(lines)
+        assert len(stacks) == count
+        assert stacks[count] == Stack([chr(ord('A') + (count - 1) % 26)])
+        assert list(Action.from_lines(lines)) == [Action(1, count, 1)]
+
+
+class TestTreapStack:
+
+    def test_from_crates(self):
+        crates = list('ABCDEFGHIJ')
+        stack = TreapStack.from_crates(crates)
+        assert len(stack) == 10
+        assert stack.crates == crates
+        assert stack.top() == 'J'
+        assert stack == Stack(crates)
+
+    def test_add_take(self):
+        stack = TreapStack()
+        assert stack.top() is None
+        stack.add('A')
+        stack.add('B')
+        assert stack.take() == 'B'
+        assert stack.crates == ['A']
+        with pytest.raises(IndexError):
+            stack.take_many(2)
+
+    def test_take_many_reverse(self):
+        stack = TreapStack.from_crates(list('ABCDEF'))
+        taken = stack.take_many(4)
+        assert stack.crates == ['A', 'B']
+        assert taken.crates == ['C', 'D', 'E', 'F']
+
+        taken.reverse()
+        assert taken.top() == 'C'
+        stack.add_many(taken)
+        assert stack.crates == ['A', 'B', 'F', 'E', 'D', 'C']
+
+        # reverse a part of an already reversed part
+        taken = stack.take_many(3)
+        taken.reverse()
+        stack.add_many(taken)
+        assert stack.crates == ['A', 'B', 'F', 'C', 'D', 'E']
+
+        stack.add_many(['X', 'Y'])
+        assert stack.top() == 'Y'
+
 
 class TestCrago:
 
@@ -171,6 +272,106 @@ class TestCrago:
         assert cargo.top_output() == 'NDP'
         assert new_cargo.top_output() == 'CMZ'
 
+    @pytest.mark.parametrize('simultaneous', (False, True))
+    def test_move_many(self, small_ex_txt, simultaneous):
+        cargo = Cargo.from_file(small_ex_txt)
+        expected = Cargo.from_file(small_ex_txt)
+        for action in cargo.actions:
+            cargo.move_many(action, simultaneous=simultaneous)
+            expected.move(action, simultaneous=simultaneous)
+            assert cargo.stacks == expected.stacks
+
+    def test_move_many_too_many(self, small_ex_txt):
+        cargo = Cargo.from_file(small_ex_txt)
+        with pytest.raises(IndexError):
+            cargo.move_many(Action(4, 1, 2))
+
+    def test_transform_both(self, small_ex_txt):
+        cargo = Cargo.from_file(small_ex_txt)
+        one_by_one, simultaneous = cargo.transform_both()
+        assert one_by_one.top_output() == 'CMZ'
+        assert simultaneous.top_output() == 'MCD'
+        assert cargo.top_output() == 'NDP', 'unchanged'
+
+    @pytest.mark.parametrize('stack_cls', (None, Stack, TreapStack))
+    def test_move_many_same_stack(self, stack_cls):
+        cargo = Cargo(stacks={1: Stack(list('ABC')), 2: Stack(['D'])}, actions=[Action(2, 1, 1)])
+        assert cargo.transform().top_output() == 'CD'
+        one_by_one, simultaneous = cargo.transform_both(stack_cls)
+        assert one_by_one.top_output() == 'CD'
+        assert simultaneous.top_output() == 'CD'
+        with pytest.raises(IndexError):
+            cargo.copy(stack_cls).move_many(Action(4, 1, 1))
+
+    @pytest.mark.parametrize('stack_cls', (None, Stack, TreapStack))
+    def test_transform_both_random(self, stack_cls):
+        cargo = with_self_moves(random_cargo(stacks=5, crates=20, actions=200, max_amount=30))
+        one_by_one, simultaneous = cargo.transform_both(stack_cls)
+        assert one_by_one.stacks == cargo.transform().stacks
+        assert simultaneous.stacks == cargo.transform(simultaneous=True).stacks
+
+    @pytest.mark.parametrize('simultaneous', (False, True))
+    def test_trace_top_output(self, small_ex_txt, simultaneous):
+        cargo = Cargo.from_file(small_ex_txt)
+        assert cargo.trace_top_output(simultaneous) == cargo.transform(simultaneous).top_output()
+
+    @pytest.mark.parametrize('seed', range(5))
+    @pytest.mark.parametrize('simultaneous', (False, True))
+    def test_trace_top_output_random(self, seed, simultaneous):
+        cargo = random_cargo(stacks=6, crates=15, actions=300, max_amount=40, seed=seed)
+        # a stack moving to itself is left unchanged
+        cargo = with_self_moves(cargo)
+        assert cargo.trace_top_output(simultaneous) == cargo.transform(simultaneous).top_output()
+
+    def test_trace_too_many(self, small_ex_txt):
+        cargo = Cargo.from_file(small_ex_txt)
+        cargo.actions.append(Action(5, 3, 1))
+        with pytest.raises(IndexError):
+            cargo.trace_top_output()
+
+    def test_treap_backend(self, small_ex_txt):
+        cargo = Cargo.from_file(small_ex_txt).copy(TreapStack)
+        assert all(isinstance(stack, TreapStack) for stack in cargo.stacks.values())
+        assert cargo.top_output() == 'NDP'
+
+        cargo.actions = Cargo.from_file(small_ex_txt).actions
+        one_by_one, simultaneous = cargo.transform_both()
+        assert isinstance(one_by_one.stacks[1], TreapStack), 'backend is kept'
+        assert one_by_one.top_output() == 'CMZ'
+        assert simultaneous.top_output() == 'MCD'
+
+
+class TestCargoReplay:
+
+    @pytest.mark.parametrize('interval', (1, 3, 7, 1000))
+    @pytest.mark.parametrize('simultaneous', (False, True))
+    def test_state_at(self, interval, simultaneous):
+        cargo = with_self_moves(random_cargo(stacks=4, crates=10, actions=50, max_amount=15), every=10)
+        replay = CargoReplay(cargo, simultaneous=simultaneous, interval=interval)
+        assert len(replay.checkpoints) == len(cargo.actions) // interval + 1
+
+        expected = cargo.copy()
+        assert replay.state_at(0).stacks == cargo.stacks
+        for index, action in enumerate(cargo.actions, start=1):
+            expected.move(action, simultaneous=simultaneous)
+            assert replay.state_at(index).stacks == expected.stacks, f'after {index} actions'
+
+    def test_state_at_invalid(self, small_ex_txt):
+        replay = CargoReplay(Cargo.from_file(small_ex_txt))
+        with pytest.raises(IndexError):
+            replay.state_at(5)
+        with pytest.raises(ValueError):
+            CargoReplay(Cargo.from_file(small_ex_txt), interval=0)
+
+    def test_memory_usage(self):
+        cargo = random_cargo(stacks=4, crates=10, actions=50, max_amount=15)
+        assert CargoReplay(cargo, interval=1).memory_usage() > CargoReplay(cargo, interval=10).memory_usage()
+
+    def test_input(self, input_txt):
+        cargo = Cargo.from_file(input_txt)
+        replay = CargoReplay(cargo, interval=50)
+        assert replay.state_at(len(cargo.actions)).top_output() == 'HBTMTBSDC'
+
 
 class TestQuestion1:
     def test_small_ex(self, small_ex_txt):
@@ -181,6 +382,26 @@ class TestQuestion1:
         cargo = Cargo.from_file(input_txt).transform()
         assert cargo.top_output() == 'HBTMTBSDC'
 
+    def test_input_both(self, input_txt):
+        q1_cargo, q2_cargo = Cargo.from_file(input_txt).transform_both()
+        assert q1_cargo.top_output() == 'HBTMTBSDC'
+        assert q2_cargo.top_output() == 'PQTJRSHWS'
+
+    def test_input_replay_file(self, input_txt):
+        q1_cargo, q2_cargo = Cargo.replay_file(input_txt)
+        assert q1_cargo.top_output() == 'HBTMTBSDC'
+        assert q2_cargo.top_output() == 'PQTJRSHWS'
+
+    def test_input_trace(self, input_txt):
+        cargo = Cargo.from_file(input_txt)
+        assert cargo.trace_top_output() == 'HBTMTBSDC'
+        assert cargo.trace_top_output(simultaneous=True) == 'PQTJRSHWS'
+
+    def test_input_treap(self, input_txt):
+        q1_cargo, q2_cargo = Cargo.from_file(input_txt).transform_both(TreapStack)
+        assert q1_cargo.top_output() == 'HBTMTBSDC'
+        assert q2_cargo.top_output() == 'PQTJRSHWS'
+
 
 class TestQuestion2:
     def test_small_ex(self, small_ex_txt):
@@ -1,13 +1,46 @@
 import dataclasses
+import mmap
+import os
+import random
+import tempfile
+import time
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from string import ascii_lowercase
 from typing import (
     ClassVar,
+    Iterable,
+    Iterator,
+    List,
     Optional,
     Self,
     Tuple,
+    Union,
 )
 
 PacketInfo = Tuple[int, Optional[str]]
+# offset of the end of the marker, marker length
+Marker = Tuple[int, int]
+Content = Union[str, bytes, mmap.mmap, memoryview]
+
+
+def first_unique_end(data: Union[bytes, mmap.mmap, memoryview], length: int, first_end: int, stop_end: int) -> int:
+    """First `end` in [first_end, stop_end) where the `length` bytes before `end` are unique, -1 if none.
+
+    Only the bytes from `first_end - length` are read, the window is slid with a last-seen table.
+    """
+    # index of the last occurrence of each byte
+    last_seen = [-1] * 256
+    # the bytes in [window_start, i] are unique
+    window_start = max(first_end - length, 0)
+    for i in range(window_start, stop_end - 1):
+        byte = data[i]
+        if last_seen[byte] >= window_start:
+            window_start = last_seen[byte] + 1
+        last_seen[byte] = i
+        if i + 1 - window_start >= length and i + 1 >= first_end:
+            return i + 1
+    return -1
 
 
 @dataclasses.dataclass
@@ -15,7 +48,9 @@ class Message:
     START_OF_PACKET_LEN: ClassVar = 4
     START_OF_MSG_LEN: ClassVar = 14
 
-    content: str
+    content: Content
+    # file mapped by `from_mmap`, the workers of `find_start_parallel` map it again
+    filename: Optional[str] = None
 
     def find_start(self, length: int, start: int = None) -> PacketInfo:
         if start is None:
@@ -24,9 +59,25 @@ class Message:
             packet = self.content[i - length:i]
             # First packet that has 4 unique characters
             if len(packet) == len(set(packet)):
-                return i, packet
+                return self._packet_info(i, length)
         return -1, None
 
+    def find_start_fast(self, length: int, start: int = None) -> PacketInfo:
+        """Same as `find_start` in O(n): the window of unique characters ending at each offset is slid along."""
+        if start is None:
+            start = length
+        data = self.content.encode('latin-1') if isinstance(self.content, str) else self.content
+        # like find_start: a marker ending with the content is not reported
+        return self._packet_info(first_unique_end(data, length, start, len(data)), length)
+
+    def _packet_info(self, end: int, length: int) -> PacketInfo:
+        if end == -1:
+            return -1, None
+        packet = self.content[end - length:end]
+        if not isinstance(packet, str):
+            packet = bytes(packet).decode('latin-1')
+        return end, packet
+
     def find_start_of_packet(self) -> PacketInfo:
         return self.find_start(self.START_OF_PACKET_LEN)
 
@@ -35,22 +86,155 @@ class Message:
 
     @classmethod
     def from_file(cls, filename: str) -> Self:
-        content = ''
         with open(filename, 'r') as f:
-            for line in f:
-                content += line.replace('\n', '')
-        return cls(content)
+            return cls(''.join(line.replace('\n', '') for line in f))
+
+    @classmethod
+    def from_mmap(cls, filename: str) -> Self:
+        """Map the file instead of reading it, meant for single line captures.
+
+        Only the new lines at the end of the file are left out of `content`, which is a view of the map.
+        """
+        with open(filename, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return cls(b'', filename)
+            # the map stays valid once the file is closed
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(mapped)
+        while size and mapped[size - 1] == ord('\n'):
+            size -= 1
+        return cls(memoryview(mapped)[:size], filename)
+
+    def find_start_parallel(self, length: int, workers: int = None, chunks: int = None) -> PacketInfo:
+        """Same as `find_start_fast` with the file of `from_mmap` mapped by a pool of processes, each scanning a slice.
+
+        Slices overlap their neighbours by `length - 1` bytes so no window is missed, the earliest hit wins.
+        """
+        if self.filename is None:
+            raise ValueError('Only a message loaded with from_mmap can be searched in parallel')
+        workers = workers or os.cpu_count() or 1
+        size = len(self.content)
+        if size <= length:
+            return -1, None
+        ends = split_ends(length, size, chunks or workers * 4)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_scan_mapped, self.filename, length, first_end, stop_end)
+                for first_end, stop_end in ends
+            ]
+            for future in futures:
+                end = future.result()
+                if end != -1:
+                    for other in futures:
+                        other.cancel()
+                    return self._packet_info(end, length)
+        return -1, None
+
+    @classmethod
+    def stream_markers(cls, filename: str, lengths: Iterable[int], chunk_size: int = 64 * 1024) -> Iterator[Marker]:
+        """Yield every marker of any of the `lengths`, reading the file by chunks.
+
+        Offsets are the same as in `from_file(filename).content`: new lines are ignored. Unlike `find_start` a marker
+        ending with the stream is reported.
+        """
+        lengths = sorted(set(lengths))
+        last_seen = [-1] * 256
+        # the bytes in [window_start, offset] are unique
+        window_start = 0
+        offset = 0
+        newline = ord('\n')
+        with open(filename, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                for byte in chunk:
+                    if byte == newline:
+                        continue
+                    if last_seen[byte] >= window_start:
+                        window_start = last_seen[byte] + 1
+                    last_seen[byte] = offset
+                    offset += 1
+                    unique = offset - window_start
+                    for length in lengths:
+                        if length > unique:
+                            break
+                        yield offset, length
+
+
+def split_ends(length: int, size: int, chunks: int) -> List[Tuple[int, int]]:
+    """Split the possible marker ends [length, size) in up to `chunks` ranges."""
+    chunk_size = max((size - length) // max(chunks, 1), 1)
+    return [
+        (first_end, min(first_end + chunk_size, size))
+        for first_end in range(length, size, chunk_size)
+    ]
+
+
+def _scan_mapped(filename: str, length: int, first_end: int, stop_end: int) -> int:
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return first_unique_end(data, length, first_end, stop_end)
+
+
+def random_capture(filename: str, size: int, letters: int = 13, seed: int = 0):
+    """Write a single line capture, with fewer letters than START_OF_MSG_LEN there is no message marker."""
+    generator = random.Random(seed)
+    alphabet = ascii_lowercase[:letters].encode()
+    with open(filename, 'wb') as f:
+        for written in range(0, size, 1024 * 1024):
+            f.write(bytes(generator.choices(alphabet, k=min(1024 * 1024, size - written))))
+
+
+def benchmark(filename: str, max_workers: int, length: int = Message.START_OF_MSG_LEN):
+    message = Message.from_mmap(filename)
+    print(f'Looking for a marker of length {length} in {len(message.content)} bytes')
+    for label, search in (
+        ('find_start', lambda: message.find_start(length)),
+        ('find_start_fast', lambda: message.find_start_fast(length)),
+    ):
+        start = time.perf_counter()
+        search()
+        print(f'{label}: {time.perf_counter() - start:.3f}s')
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        message.find_start_parallel(length, workers=workers)
+        print(f'find_start_parallel with {workers} workers: {time.perf_counter() - start:.3f}s')
+        workers *= 2
 
 
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--fast', action='store_true', default=False, help='Use the sliding window search')
+    parser.add_argument('--all-markers', type=int, nargs='*', default=None, help='Stream every marker of these lengths')
+    parser.add_argument('--workers', type=int, default=0, help='Search a memory map with a pool of processes')
+    parser.add_argument('--benchmark', type=int, default=0, help='Benchmark the search on a random capture of N bytes')
     args = parser.parse_args()
 
-    message = Message.from_file(args.input)
+    if args.benchmark:
+        with tempfile.TemporaryDirectory() as directory:
+            capture = os.path.join(directory, 'capture.txt')
+            random_capture(capture, args.benchmark)
+            benchmark(capture, args.workers or os.cpu_count() or 1)
+    elif args.all_markers is not None:
+        for marker_offset, marker_length in Message.stream_markers(
+            args.input,
+            args.all_markers or (Message.START_OF_PACKET_LEN, Message.START_OF_MSG_LEN),
+        ):
+            print(f'Marker of length {marker_length} at offset {marker_offset}')
+    elif args.workers:
+        message = Message.from_mmap(args.input)
+
+        offset, packet = message.find_start_parallel(Message.START_OF_PACKET_LEN, args.workers)
+        print(f'Q1: start of packets offset: {offset} {packet}')
+
+        offset, _ = message.find_start_parallel(Message.START_OF_MSG_LEN, args.workers)
+        print(f'Q2: start of message offset: {offset}')
+    else:
+        message = Message.from_file(args.input)
 
-    offset, packet = message.find_start_of_packet()
-    print(f'Q1: start of packets offset: {offset} {packet}')
+        find_start = message.find_start_fast if args.fast else message.find_start
+        offset, packet = find_start(Message.START_OF_PACKET_LEN)
+        print(f'Q1: start of packets offset: {offset} {packet}')
 
-    offset, _ = message.find_start_of_message()
-    print(f'Q2: start of message offset: {offset}')
+        offset, _ = find_start(Message.START_OF_MSG_LEN)
+        print(f'Q2: start of message offset: {offset}')
@@ -2,7 +2,11 @@ import os
 
 import pytest
 
-from .compute import Message
+from .compute import (
+    Message,
+    random_capture,
+    split_ends,
+)
 
 
 @pytest.fixture(scope='session')
@@ -35,6 +39,94 @@ class TestMessage:
     def test_find_start_of_message(self, content, expected_index):
         assert Message(content).find_start_of_message()[0] == expected_index
 
+    @pytest.mark.parametrize('content', (
+        'mjqjpqmgbljsphdztnvjfqwrcgsmlb',
+        'zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw',
+        'abcd',
+        'abcde',
+        'aaaaaaaa',
+        '',
+    ))
+    @pytest.mark.parametrize('length', (1, 2, 4, 14))
+    def test_find_start_fast(self, content, length):
+        assert Message(content).find_start_fast(length) == Message(content).find_start(length)
+
+    @pytest.mark.parametrize('start', (4, 5, 8, 20))
+    def test_find_start_fast_from(self, start):
+        content = 'mjqjpqmgbljsphdztnvjfqwrcgsmlb'
+        assert Message(content).find_start_fast(4, start) == Message(content).find_start(4, start)
+
+    def test_find_start_fast_bytes(self):
+        assert Message(b'mjqjpqmgbljsphdztnvjfqwrcgsmlb').find_start_fast(4) == (7, 'jpqm')
+        assert Message(b'mjqjpqmgbljsphdztnvjfqwrcgsmlb').find_start(4) == (7, 'jpqm')
+
+    @pytest.mark.parametrize('chunk_size', (1, 3, 1024))
+    def test_stream_markers(self, tmp_path, chunk_size):
+        stream_file = tmp_path / "ex1.txt"
+        content = 'mjqjpqmgbljsphdztnvjfqwrcgsmlb'
+        stream_file.write_text(content[:10] + '\n' + content[10:] + '\n')
+        message = Message(content)
+
+        markers = list(Message.stream_markers(stream_file, (4, 14), chunk_size=chunk_size))
+        assert markers == sorted(markers)
+        for length in (4, 14):
+            offsets = [offset for offset, marker_length in markers if marker_length == length]
+            assert offsets == [
+                end
+                for end in range(length, len(content) + 1)
+                if len(set(content[end - length:end])) == length
+            ]
+            assert offsets[0] == message.find_start(length)[0]
+
+    def test_stream_markers_input(self, input_txt):
+        message = Message.from_file(input_txt)
+        first = {}
+        for offset, length in Message.stream_markers(input_txt, (14, 4), chunk_size=100):
+            first.setdefault(length, offset)
+        assert first == {4: 1080, 14: message.find_start_of_message()[0]}
+
+
+class TestParallel:
+
+    @pytest.mark.parametrize('content', (
+        'mjqjpqmgbljsphdztnvjfqwrcgsmlb',
+        'zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw',
+        'abcd',
+        'abcde',
+        'aaaaaaaaaaaaaaaaaaaaaaab',
+        '',
+        'aabcd\n',
+        'mjqjpqmgbljsphdztnvjfqwrcgsmlb\n\n',
+        '\n',
+    ))
+    @pytest.mark.parametrize('length', (4, 14))
+    def test_find_start_parallel(self, tmp_path, content, length):
+        capture = tmp_path / "ex1.txt"
+        capture.write_text(content)
+        message = Message.from_mmap(capture)
+        expected = Message.from_file(capture).find_start(length)
+        assert message.find_start(length) == expected
+        assert message.find_start_fast(length) == expected
+        for chunks in (1, 2, 5, 100):
+            assert message.find_start_parallel(length, workers=2, chunks=chunks) == expected
+
+    def test_find_start_parallel_not_mapped(self):
+        with pytest.raises(ValueError):
+            Message('mjqjpqmgbljsphdztnvjfqwrcgsmlb').find_start_parallel(4)
+
+    def test_split_ends(self):
+        assert split_ends(4, 20, 3) == [(4, 9), (9, 14), (14, 19), (19, 20)]
+        assert split_ends(4, 5, 3) == [(4, 5)]
+
+    def test_random_capture(self, tmp_path):
+        capture = tmp_path / "ex1.txt"
+        random_capture(capture, 5000, letters=26)
+        message = Message.from_mmap(capture)
+        assert len(message.content) == 5000
+        expected = message.find_start(Message.START_OF_MSG_LEN)
+        assert expected[0] != -1
+        assert message.find_start_parallel(Message.START_OF_MSG_LEN, workers=3, chunks=50)[0] == expected[0]
+
 
 class TestQuestions:
 
@@ -43,3 +135,8 @@ class TestQuestions:
 
     def test_q2(self, input_txt):
         assert Message.from_file(input_txt).find_start_of_message()[0] == 3645
+
+    def test_fast(self, input_txt):
+        message = Message.from_file(input_txt)
+        assert message.find_start_fast(Message.START_OF_PACKET_LEN) == (1080, 'dcmv')
+        assert message.find_start_fast(Message.START_OF_MSG_LEN) == message.find_start_of_message()
@@ -1,7 +1,11 @@
 import abc
 import dataclasses
+import random
 import re
+import sys
+import time
 from argparse import ArgumentParser
+from array import array
 from operator import attrgetter
 from typing import (
     ClassVar,
@@ -77,14 +81,48 @@ class File(BaseFile):
 @dataclasses.dataclass
 class Dir(BaseFile):
     PARENT_NAME: ClassVar[str] = '..'
+    cd_cmd_re: ClassVar = re.compile(r'^\$ cd (.+)')
+    ls_cmd_re: ClassVar = re.compile(r'^\$ ls')
+    dir_line_re: ClassVar = re.compile(r'^dir (.+)')
+    file_line_re: ClassVar = re.compile(r'^(\d+) (.+)')
 
     # files or dir
     files: List[File] = dataclasses.field(default_factory=list)
     sub_dirs: Dict[str, Self] = dataclasses.field(default_factory=dict)
+    # size of the whole subtree, None when it has to be computed again
+    _cached_size: Optional[int] = dataclasses.field(default=None, repr=False, compare=False)
 
     @property
     def size(self) -> int:
-        return sum((f.size for f in self.files + list(self.sub_dirs.values())))
+        if self._cached_size is None:
+            return self.compute_sizes()
+        return self._cached_size
+
+    def compute_sizes(self) -> int:
+        """Fill the size cache of the dirs of the subtree that need it in one post-order pass."""
+        pending = [(self, False)]
+        while pending:
+            current, children_done = pending.pop()
+            if current._cached_size is not None:
+                continue
+            if children_done:
+                current._cached_size = sum(f.size for f in current.files) + sum(
+                    d._cached_size for d in current.sub_dirs.values()
+                )
+            else:
+                pending.append((current, True))
+                pending.extend((d, False) for d in current.sub_dirs.values())
+        return self._cached_size
+
+    def invalidate_size(self):
+        """Drop the cached size of this dir and its parents.
+
+        A dir without cached size never has a parent with a cached size so we can stop there.
+        """
+        current = self
+        while current is not None and current._cached_size is not None:
+            current._cached_size = None
+            current = current.parent
 
     @property
     def has_subdirs(self) -> bool:
@@ -95,33 +133,37 @@ class Dir(BaseFile):
             self.sub_dirs[other.name] = other
         else:
             self.files.append(other)
+        self.invalidate_size()
 
     def change_dir(self, target: str) -> Optional[Self]:
         if target == self.PARENT_NAME:
             return self.parent
         return self.sub_dirs.get(target)
 
-    def load_list(self, commands: List[str]) -> List[str]:
-        dir_line = re.compile(r'^dir (.+)')
-        file_line = re.compile(r'^(\d+) (.+)')
-        while commands and not commands[0].startswith('$'):
-            line = commands.pop(0)
-
-            is_dir = dir_line.match(line)
-            if is_dir is not None:
-                dir_name = is_dir.group(1)
-                if dir_name in (self.ROOT_NAME, self.PARENT_NAME):
-                    raise RuntimeError('Cannot add a reserved name')
-                self.add(Dir(dir_name, parent=self))
-                continue
+    def load_list_line(self, line: str):
+        """Add the dir or file of one line of `ls` output."""
+        is_dir = self.dir_line_re.match(line)
+        if is_dir is not None:
+            dir_name = is_dir.group(1)
+            if dir_name in (self.ROOT_NAME, self.PARENT_NAME):
+                raise RuntimeError('Cannot add a reserved name')
+            self.add(Dir(dir_name, parent=self))
+            return
 
-            is_file = file_line.match(line)
-            if is_file is not None:
-                self.add(File(is_file.group(2), _size=int(is_file.group(1)), parent=self))
-                continue
+        is_file = self.file_line_re.match(line)
+        if is_file is not None:
+            self.add(File(is_file.group(2), _size=int(is_file.group(1)), parent=self))
+            return
 
-            raise RuntimeError(f'Unexpected ls line: {line}')
+        raise RuntimeError(f'Unexpected ls line: {line}')
 
+    def load_list(self, commands: List[str]) -> List[str]:
+        consumed = 0
+        while consumed < len(commands) and not commands[consumed].startswith('$'):
+            self.load_list_line(commands[consumed])
+            consumed += 1
+        # remove the consumed lines at once rather than one by one from the front
+        del commands[:consumed]
         return commands
 
     def search_subdirs(self, max_size: int = None, min_size: int = None) -> Iterable[Self]:
@@ -134,17 +176,17 @@ class Dir(BaseFile):
 
     @classmethod
     def create_tree(cls, lines: Iterable[str]) -> Self:
-        commands = list(lines)  # copy so we can pop without changing the input
+        """Build the tree line by line: `lines` can be a file or any iterator, it is consumed only once."""
         root = Dir(name=cls.ROOT_NAME)
         current_dir: Optional[Dir] = None
+        # the lines are the output of `ls` in current_dir
+        listing = False
 
-        cd_cmd = re.compile(r'^\$ cd (.+)')
-        ls_cmd = re.compile(r'^\$ ls')
-
-        while commands:
-            line = commands.pop(0)
-            is_cd = cd_cmd.match(line)
+        for line in lines:
+            line = line.replace('\n', '')
+            is_cd = cls.cd_cmd_re.match(line)
             if is_cd is not None:
+                listing = False
                 target = is_cd.group(1)
                 if target == root.name:
                     current_dir = root
@@ -154,10 +196,14 @@ class Dir(BaseFile):
                     raise RuntimeError('No current dir')
                 continue
 
-            if ls_cmd.match(line) is not None:
+            if cls.ls_cmd_re.match(line) is not None:
                 if current_dir is None:
                     raise RuntimeError('No current dir')
-                commands = current_dir.load_list(commands)
+                listing = True
+                continue
+
+            if listing and not line.startswith('$'):
+                current_dir.load_list_line(line)
                 continue
 
             raise RuntimeError(f'Unexpected line: {line}')
@@ -166,16 +212,9 @@ class Dir(BaseFile):
 
     @classmethod
     def load_from_script(cls, filename: str) -> Self:
-        # TODO(tr) Make the create_tree work without having to load the whole file in memory?
-        #  maybe command by command?
-        #  or line by line to work a bit like a pipe?
         print(f'Loading {filename}')
         with open(filename, 'r') as f:
-            lines = [
-                line.replace('\n', '')
-                for line in f
-            ]
-        return cls.create_tree(lines)
+            return cls.create_tree(f)
 
 
 def compute_q1(from_dir: Dir, max_size=100000, verbose=False) -> int:
@@ -217,18 +256,142 @@ def compute_q2(from_dir: Dir, desired_size=30000000, fs_size=70000000, verbose=F
     return selected.size
 
 
+def _du_change_dir(open_dirs: List[int], sizes: array, target: str):
+    """Move to `target`, closing dirs when going up: their size is added to their parent and to `sizes`."""
+
+    def close_dir():
+        size = open_dirs.pop()
+        sizes.append(size)
+        if open_dirs:
+            open_dirs[-1] += size
+
+    if target == Dir.ROOT_NAME:
+        while len(open_dirs) > 1:
+            close_dir()
+        if not open_dirs:
+            open_dirs.append(0)
+    elif not open_dirs:
+        raise RuntimeError('No current dir')
+    elif target == Dir.PARENT_NAME:
+        if len(open_dirs) == 1:
+            raise RuntimeError('No parent dir')
+        close_dir()
+    else:
+        open_dirs.append(0)
+
+
+def du_sizes(lines: Iterable[str]) -> array:
+    """Total size of every dir of the transcript without building a tree, the root dir is the last one.
+
+    Only the sizes of the dirs from the root to the current one are kept: when leaving a dir its size is added to
+    its parent. Each dir is expected to be visited once, like in a `du` walk.
+    """
+    sizes = array('q')
+    # sizes of the open dirs, the root first
+    open_dirs: List[int] = []
+
+    for line in lines:
+        line = line.replace('\n', '')
+        is_cd = Dir.cd_cmd_re.match(line)
+        if is_cd is not None:
+            _du_change_dir(open_dirs, sizes, is_cd.group(1))
+            continue
+
+        if not open_dirs:
+            raise RuntimeError('No current dir')
+
+        if Dir.ls_cmd_re.match(line) is not None or Dir.dir_line_re.match(line) is not None:
+            continue
+
+        is_file = Dir.file_line_re.match(line)
+        if is_file is not None:
+            open_dirs[-1] += int(is_file.group(1))
+            continue
+
+        raise RuntimeError(f'Unexpected line: {line}')
+
+    # leave all the dirs, the root is the last one
+    if open_dirs:
+        _du_change_dir(open_dirs, sizes, Dir.ROOT_NAME)
+        sizes.append(open_dirs.pop())
+    return sizes
+
+
+def du_compute_q1(sizes: array, max_size=100000) -> int:
+    """Same as `compute_q1` from the sizes of `du_sizes`."""
+    return sum(size for size in sizes[:-1] if size < max_size)
+
+
+def du_compute_q2(sizes: array, desired_size=30000000, fs_size=70000000) -> int:
+    """Same as `compute_q2` from the sizes of `du_sizes`."""
+    if not sizes:
+        return 0
+    current_free = fs_size - sizes[-1]
+    if current_free >= desired_size:
+        return 0
+    target = desired_size - current_free
+    return min((size for size in sizes[:-1] if size >= target), default=0)
+
+
+def random_tree(entries: int, dir_ratio: float = 0.1, seed: int = 0) -> Dir:
+    """Tree of `entries` files and dirs, each one added to a random dir."""
+    generator = random.Random(seed)
+    root = Dir(name=Dir.ROOT_NAME)
+    dirs = [root]
+    for i in range(entries):
+        parent = generator.choice(dirs)
+        if generator.random() < dir_ratio:
+            new_dir = Dir(f'd{i}', parent=parent)
+            parent.add(new_dir)
+            dirs.append(new_dir)
+        else:
+            parent.add(File(f'f{i}', _size=generator.randint(1, 100000), parent=parent))
+    return root
+
+
+def benchmark(entries: int):
+    start = time.perf_counter()
+    root = random_tree(entries)
+    print(f'Created {entries} entries in {time.perf_counter() - start:.2f}s')
+
+    for label, compute in (
+        ('compute_q1 (cold cache)', lambda: compute_q1(root)),
+        ('compute_q1', lambda: compute_q1(root)),
+        ('compute_q2', lambda: compute_q2(root, fs_size=root.size + 1000)),
+    ):
+        start = time.perf_counter()
+        compute()
+        print(f'{label}: {time.perf_counter() - start:.2f}s')
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
-    parser.add_argument('--input', type=str, default='input.txt', help='Input file')
+    parser.add_argument('--input', type=str, default='input.txt', help='Input file, - for stdin')
     parser.add_argument('--q2-fs-size', type=int, default=70000000, help='Q2: Total file system size')
     parser.add_argument('--q2-target', type=int, default=30000000, help='Q2: Target to free')
     parser.add_argument('-v', '--verbose', action='store_true', default=False)
+    parser.add_argument('--benchmark', type=int, default=0, help='Benchmark q1 and q2 on a random tree of N entries')
+    parser.add_argument('--du', action='store_true', default=False, help='Only compute the dir sizes, without tree')
     args = parser.parse_args()
 
-    root = Dir.load_from_script(args.input)
+    if args.benchmark:
+        benchmark(args.benchmark)
 
-    q1 = compute_q1(root, verbose=args.verbose)
-    print(f'Q1: total size: {q1} (human: {format_size(q1)})')
+    if args.du:
+        if args.input == '-':
+            dir_sizes = du_sizes(sys.stdin)
+        else:
+            with open(args.input, 'r') as f:
+                dir_sizes = du_sizes(f)
+        q1 = du_compute_q1(dir_sizes)
+        q2 = du_compute_q2(dir_sizes, args.q2_target, args.q2_fs_size)
+    else:
+        if args.input == '-':
+            root = Dir.create_tree(sys.stdin)
+        else:
+            root = Dir.load_from_script(args.input)
+        q1 = compute_q1(root, verbose=args.verbose)
+        q2 = compute_q2(root, args.q2_target, args.q2_fs_size, verbose=args.verbose)
 
-    q2 = compute_q2(root, args.q2_target, args.q2_fs_size, verbose=args.verbose)
+    print(f'Q1: total size: {q1} (human: {format_size(q1)})')
     print(f'Q2: total to save: {q2}')
@@ -4,9 +4,14 @@ import pytest
 
 from .compute import (
     Dir,
+    File,
     compute_q1,
     compute_q2,
+    du_compute_q1,
+    du_compute_q2,
+    du_sizes,
     format_size,
+    random_tree,
 )
 
 
@@ -97,6 +102,33 @@ class TestDir:
         assert d.size == 24933642
         assert d.has_subdirs is False
 
+    def test_create_tree_from_iterator(self, small_ex_txt, small_ex):
+        with open(small_ex_txt, 'r') as f:
+            lines = (line for line in f)
+            root = Dir.create_tree(lines)
+            assert next(lines, None) is None, 'consumed'
+        assert [
+            (d.full_path, d.size)
+            for d in root.search_subdirs(min_size=0)
+        ] == [
+            (d.full_path, d.size)
+            for d in small_ex.search_subdirs(min_size=0)
+        ]
+        assert root.size == small_ex.size
+
+    @pytest.mark.parametrize('lines', (
+        ('$ ls', 'dir a'),  # no cd before
+        ('$ cd a',),
+        ('$ cd /', 'dir a'),  # no ls before
+        ('$ cd /', '$ ls', 'dir a', '$ cd a', 'dir b'),  # cd ends the listing
+        ('$ cd /', '$ ls', 'dir ..'),
+        ('$ cd /', '$ ls', 'a b'),
+        ('$ cd /', '$ pwd'),
+    ))
+    def test_create_tree_errors(self, lines):
+        with pytest.raises(RuntimeError):
+            Dir.create_tree(lines)
+
     def test_search_subdirs(self, small_ex):
         found = list(small_ex.search_subdirs(100000))
 
@@ -106,6 +138,73 @@ class TestDir:
         assert found[1].name == 'e'
         assert found[1].size == 584
 
+    def test_size_cache(self):
+        root = Dir('/')
+        a = Dir('a', parent=root)
+        root.add(a)
+        b = Dir('b', parent=a)
+        a.add(b)
+        b.add(File('x', parent=b, _size=10))
+        root.add(File('y', parent=root, _size=5))
+        assert root.size == 15
+        assert (root._cached_size, a._cached_size, b._cached_size) == (15, 10, 10)
+
+        b.add(File('z', parent=b, _size=100))
+        assert (root._cached_size, a._cached_size, b._cached_size) == (None, None, None), 'parents invalidated'
+        assert a.size == 110
+        assert root._cached_size is None, 'only the subtree is computed'
+        assert root.size == 115
+
+        root.add(Dir('c', parent=root))
+        assert a._cached_size == 110, 'siblings are kept'
+        assert root.size == 115
+
+    def test_random_tree(self):
+        root = random_tree(2000)
+
+        def naive_size(current: Dir) -> int:
+            return sum(f.size for f in current.files) + sum(naive_size(d) for d in current.sub_dirs.values())
+
+        assert root.size == naive_size(root)
+        assert all(d.size == naive_size(d) for d in root.search_subdirs(min_size=0))
+
+
+class TestDu:
+
+    def test_small_ex(self, small_ex_txt):
+        with open(small_ex_txt, 'r') as f:
+            sizes = du_sizes(f)
+        # e, a, d then root
+        assert sizes.tolist() == [584, 94853, 24933642, 48381165]
+        assert du_compute_q1(sizes) == 95437
+        assert du_compute_q2(sizes) == 24933642
+
+    def test_input(self, input_txt):
+        with open(input_txt, 'r') as f:
+            sizes = du_sizes(f)
+        root = Dir.load_from_script(input_txt)
+        assert sorted(sizes[:-1]) == sorted(d.size for d in root.search_subdirs(min_size=0))
+        assert sizes[-1] == root.size
+        assert du_compute_q1(sizes) == 1501149
+        assert du_compute_q2(sizes) == 10096985
+
+    def test_no_deletion(self, small_ex_txt):
+        with open(small_ex_txt, 'r') as f:
+            sizes = du_sizes(f)
+        assert du_compute_q2(sizes, fs_size=100000000) == 0
+        assert du_compute_q2(sizes, desired_size=10 ** 10, fs_size=10 ** 10 + 1) == 0, 'no dir large enough'
+        assert du_compute_q2(du_sizes([])) == 0
+
+    @pytest.mark.parametrize('lines', (
+        ('$ ls', '10 a'),
+        ('$ cd a',),
+        ('$ cd /', '$ cd ..'),
+        ('$ cd /', '$ pwd'),
+    ))
+    def test_errors(self, lines):
+        with pytest.raises(RuntimeError):
+            du_sizes(lines)
+
 
 class TestQuestion1:
 